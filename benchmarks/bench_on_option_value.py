@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Time the enter/exit cost of :meth:`.Config.on_option_value`.
+
+Run with::
+
+    python benchmarks/bench_on_option_value.py
+
+.. codeauthor:: Jaume Bonet <jaume.bonet@gmail.com>
+"""
+# Standard Libraries
+from __future__ import print_function
+import argparse
+import timeit
+
+# This Library
+from libconfig import Config
+
+
+def make_config(n_options):
+    cfg = Config()
+    for i in range(n_options):
+        cfg.register_option("section{}".format(i % 10), "option{}".format(i),
+                            i, "int", "option number {}".format(i))
+    return cfg
+
+
+def run(cfg, n_changed, number):
+    args = []
+    for i in range(n_changed):
+        args.extend(["section{}".format(i % 10), "option{}".format(i), -i])
+
+    def override():
+        with cfg.on_option_value(*args):
+            pass
+
+    best = min(timeit.repeat(override, number=number, repeat=3))
+    return best / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=200,
+                        help="enter/exit cycles per measure")
+    options = parser.parse_args()
+
+    print("{:>10}  {:>10}  {:>14}".format("options", "changed", "usec/cycle"))
+    for n_options in (10, 100, 1000):
+        cfg = make_config(n_options)
+        for n_changed in (1, 5):
+            usec = run(cfg, n_changed, options.number) * 1e6
+            print("{:>10}  {:>10}  {:>14.1f}".format(n_options, n_changed,
+                                                     usec))
+
+
+if __name__ == "__main__":
+    main()
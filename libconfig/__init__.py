@@ -10,6 +10,9 @@
 
 
 from .config import *
+from .shared import *
+from .server import *
+from .prometheus import *
 
 from ._version import get_versions
 __version__ = get_versions()['version']
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""
+Run the command line tool as ``python -m libconfig``.
+
+.. codeauthor:: Jaume Bonet <jaume.bonet@gmail.com>
+"""
+import sys
+
+from .cli import main
+
+sys.exit(main())
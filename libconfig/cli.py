@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Command line tool to inspect, validate and convert configuration files.
+
+Options are taken from a python module that registers them on a
+:class:`.Config`, given as ``module`` or ``module:attribute``::
+
+    libconfig mypackage.core list
+    libconfig mypackage.core:cfg validate -j 8 deploy/*.yaml
+    libconfig mypackage.core convert config.yaml config.toml
+    libconfig mypackage.core show --format json site.yaml user.env
+
+.. codeauthor:: Jaume Bonet <jaume.bonet@gmail.com>
+"""
+# Standard Libraries
+import argparse
+import importlib
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+# This Library
+from .config import Config
+
+__all__ = ['main', 'load_config']
+
+# Configuration used by the validation workers
+_CONFIG = None
+
+
+def load_config(spec):
+    """Import the :class:`.Config` that a module registers options on.
+
+    :param str spec: ``module:attribute``. Without ``attribute``, the
+        first :class:`.Config` found in the module is used.
+
+    :return: :class:`.Config`
+
+    :raise:
+        :ValueError: If the module has no :class:`.Config`.
+    """
+    name, _, attribute = spec.partition(":")
+    module = importlib.import_module(name)
+    if attribute:
+        config = module
+        for part in attribute.split("."):
+            config = getattr(config, part)
+        return config
+    for value in vars(module).values():
+        if isinstance(value, Config):
+            return value
+    raise ValueError("No Config found in module {}".format(name))
+
+
+def _init_worker(spec):
+    global _CONFIG
+    _CONFIG = load_config(spec)
+
+
+def _validate(task):
+    """Load a file strictly on a pristine configuration.
+
+    :return: (file name, error message or :data:`None`)
+    """
+    filename, file_format, strict = task
+    config = _CONFIG
+    snapshot = config.snapshot()
+    config.trace()
+    try:
+        config.set_options_from_file(filename, file_format, strict=True)
+        unmatched = config.unmatched_entries()
+        if strict and unmatched:
+            return filename, "unknown options: {}".format(", ".join(
+                "{0}.{1}".format(*k) for k in unmatched))
+        return filename, None
+    except Exception as e:
+        return filename, "{0}: {1}".format(type(e).__name__, e)
+    finally:
+        config.trace(False)
+        config.restore(snapshot)
+
+
+def _list(config, args):
+    config.document_options(args.format, details=True,
+                            by_section=args.by_section, stream=sys.stdout)
+    return 0
+
+
+def _validate_files(config, args):
+    tasks = [(f, args.file_format, args.strict) for f in args.files]
+    jobs = min(args.jobs or multiprocessing.cpu_count(), len(tasks))
+    if jobs <= 1:
+        _init_worker(args.config)
+        results = [_validate(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(jobs, _init_worker, (args.config, ))
+        try:
+            results = pool.map(_validate, tasks,
+                               chunksize=max(1, len(tasks) // (jobs * 4)))
+        finally:
+            pool.close()
+            pool.join()
+    failed = 0
+    for filename, error in results:
+        if error is None:
+            print("OK    {}".format(filename))
+        else:
+            failed += 1
+            print("FAIL  {0}: {1}".format(filename, error))
+    return 1 if failed else 0
+
+
+def _convert(config, args):
+    config.set_options_from_file(args.source, args.file_format)
+    config.write_options_to_file(args.target, args.to)
+    return 0
+
+
+def _show(config, args):
+    for filename in args.files:
+        config.set_options_from_file(filename, args.file_format)
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, "config")
+        config.write_options_to_file(filename, args.format)
+        with open(filename) as fd:
+            sys.stdout.write(fd.read())
+    finally:
+        shutil.rmtree(directory)
+    return 0
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog="libconfig",
+        description="Inspect, validate and convert configuration files.")
+    parser.add_argument("config", help="Module registering the options, "
+                        "as module or module:attribute.")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    command = commands.add_parser("list", help="List the options.")
+    command.add_argument("--format", default="rst",
+                         choices=["rst", "markdown", "html"])
+    command.add_argument("--by-section", action="store_true",
+                         help="One table per section.")
+    command.set_defaults(function=_list)
+
+    command = commands.add_parser("validate", help="Validate files.")
+    command.add_argument("files", nargs="+")
+    command.add_argument("-j", "--jobs", type=int, default=None,
+                         help="Parallel processes (default: CPU count).")
+    command.add_argument("--strict", action="store_true",
+                         help="Fail on values of unknown options.")
+    command.set_defaults(function=_validate_files)
+
+    command = commands.add_parser("convert", help="Convert a file to "
+                                  "another format.")
+    command.add_argument("source")
+    command.add_argument("target")
+    command.add_argument("--to", default=None,
+                         help="Format of target (default: from extension).")
+    command.set_defaults(function=_convert)
+
+    command = commands.add_parser("show", help="Print the configuration "
+                                  "resulting from loading files in order.")
+    command.add_argument("files", nargs="*")
+    command.add_argument("--format", default="yaml",
+                         choices=["yaml", "json", "toml", "ini", "env"])
+    command.set_defaults(function=_show)
+
+    for name in ("validate", "convert", "show"):
+        commands.choices[name].add_argument(
+            "--file-format", default=None,
+            help="Format of the input files (default: from extension).")
+    return parser
+
+
+def main(argv=None):
+    """Run the command line tool.
+
+    :param argv: Arguments; :data:`sys.argv` if not provided.
+    :type argv: :func:`list` of :class:`str`
+
+    :return: :class:`int` - exit status.
+    """
+    args = _parser().parse_args(argv)
+    if os.getcwd() not in sys.path and "" not in sys.path:
+        sys.path.insert(0, os.getcwd())
+    return args.function(load_config(args.config), args)
@@ -5,20 +5,45 @@ A configuration library for libraries.
 .. codeauthor:: Jaume Bonet <jaume.bonet@gmail.com>
 """
 # Standard Libraries
+import functools
+import fnmatch
+import itertools
 import json
+import atexit
 import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from contextlib import contextmanager
+from timeit import default_timer
 
 # External Libraries
+import numpy as np
 import pandas as pd
 import yaml
 import six
+from six.moves import configparser
+try:
+    import tomllib as toml
+except ImportError:
+    try:
+        import tomli as toml
+    except ImportError:
+        try:
+            import toml
+        except ImportError:
+            toml = None
 
 # This Library
 import libconfig.evaluator as ev
 
 if six.PY2:
+    from cgi import escape
     from subprocess import check_output, CalledProcessError    # nosec
 else:
+    from html import escape
     from subprocess import run, PIPE    # nosec
 
 
@@ -26,48 +51,125 @@ pd.set_option('display.max_colwidth', -1)
 
 __all__ = ['Config', 'AlreadyRegisteredError', 'NotRegisteredError']
 
+AuditRecord = namedtuple('AuditRecord', ['timestamp', 'key', 'subkey', 'old',
+                                         'new', 'source'])
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+ConfigDiff = namedtuple('ConfigDiff', ['added', 'removed', 'changed'])
+OptionView = namedtuple('OptionView', ['key', 'subkey', 'value', 'type',
+                                       'default', 'locked', 'description',
+                                       'values', 'shape'])
+# Separates positional from keyword arguments in Config.memoize cache keys
+_KWARGS_MARK = object()
+
+# Version of the serialized state produced by Config._state
+_STATE_VERSION = 1
+# Calls instrumented by Config.instrument and their column in the statistics
+_INSTRUMENTED = OrderedDict([('get_option', 0), ('set_option', 2),
+                             ('check_option', 4)])
+# Clock of the audit log timestamps
+_monotonic = getattr(time, 'monotonic', time.time)
+# Snapshots chained on top of each other before one is stored in full
+_SNAPSHOT_DEPTH = 32
+
 
 class Config(object):
     def __init__(self):
         self.clmn = ['k1', 'k2', 'value', 'type',
-                     'default', 'locked', 'description', 'values']
+                     'default', 'locked', 'description', 'values',
+                     'shape']
         self.gc = pd.DataFrame(columns=self.clmn)
         self.open = True
+        self._journals = []
+        self._subscribers = OrderedDict()
+        self._subscription_ids = itertools.count()
+        self._pending = None
+        self._generation = 0
+        self._generations = {}
+        self._index = None
+        self._tree = None
+        self._types = None
+        self._locked = None
+        self._snapshot = None
+        self._snapshot_dirty = set()
+        self._views = None
+        self._stats = None
+        self._stats_totals = [0, 0.0, 0, 0.0, 0, 0.0]
+        self._cache_totals = [0, 0]
+        self._loads = 0
+        self._load_totals = LoadProfile()
+        self._instrumenting = False
+        self._tracing = False
+        self._trace_at_exit = False
+        self._accessed = None
+        self._unmatched = None
+        self._audit = None
+        self._audit_records = None
+        self._audit_source = None
+        self._profile_loads = False
+        self._load_hooks = OrderedDict()
+        self._load_profile = None
+        # Validators of Config.compile_validator, until options are
+        # (un)registered
+        self._validators = {}
 
     def register_option(self, key, subkey, default, _type, definition,
-                        values=None, locked=False):
+                        values=None, locked=False, shape=None):
         """Create a new option.
 
-        :param str key: First identifier of the option.
-        :param str subkey: Second identifier of the option.
+        :param str key: First identifier of the option. Dots split it into
+            nested sections (``solver.linear``), which are kept as nested
+            dictionaries when reading and writing configuration files.
+        :param str subkey: Second identifier of the option. Cannot contain
+            dots.
         :param default: Default value of the option. Type varies and it is
             described by ``_type``.
         :param str _type: Type of the value of the option. Available
             options are: [``int``, ``float``, ``bool``, ``text``,
-            ``string``, ``path_in``, ``path_out``].
+            ``string``, ``path_in``, ``path_out``, ``int_array``,
+            ``float_array``, ``bool_array``].
         :param str definition: Brief explanation of the option.
         :type definition: :class:`str`
-        :param values: Available values for the option.
+        :param values: Available values for the option. For array types,
+            these are the values accepted for each element.
         :type values: :func:`list` of accepted ``_type``
         :param bool locked: If True, option cannot be altered.
+        :param tuple shape: Only for array types. Expected shape of the
+            value; use :data:`None` or ``-1`` for dimensions of any length.
+
+        Array types are stored as read-only :class:`~numpy.ndarray`, which
+        are returned as they are (without copy) by :meth:`.get_option`.
 
         :raise:
             :AlreadyRegisteredError: If ``key`` or ``subkey`` already
                 define an option.
+            :ValueError: If ``shape`` is provided for a non-array type.
+            :ValueError: If the option's name clashes with a section name,
+                or the other way around.
 
         """
         if not self.open:
             return
 
         key, subkey = _lower_keys(key, subkey)
-        _entry_must_not_exist(self.gc, key, subkey)
+        _entry_must_not_exist(self._get_index(), key, subkey)
+        _tree_check(self._tree, key, subkey)
 
         ev.value_eval(default, _type)
+        if shape is not None:
+            if not ev.is_array_type(_type):
+                raise ValueError("shape can only be defined for array types")
+            shape = tuple(shape)
+            ev.shape_eval(default, shape)
+        default = ev.cast(default, _type)
         values = None if values is False else values
         new_opt = pd.Series([key, subkey, default, _type, default,
-                             locked, definition, values], index=self.clmn)
+                             locked, definition, values, shape],
+                            index=self.clmn)
 
         self.gc = self.gc.append(new_opt, ignore_index=True)
+        self._index_option(key, subkey, self.gc.shape[0] - 1, _type, locked)
+        self._log_undo('register', key, subkey)
+        self._changed([(key, subkey)])
 
     def unregister_option(self, key, subkey):
         """Removes an option from the manager.
@@ -83,10 +185,13 @@ class Config(object):
             return
 
         key, subkey = _lower_keys(key, subkey)
-        _entry_must_exist(self.gc, key, subkey)
+        pos = self._position(key, subkey)
 
-        self.gc = self.gc[~((self.gc['k1'] == key) &
-                            (self.gc['k2'] == subkey))]
+        if self._journals:
+            self._log_undo('unregister', pos, self.gc.iloc[[pos]])
+        self.gc = self.gc.drop(self.gc.index[pos])
+        self._reset_index()
+        self._changed([(key, subkey)])
 
     def get_option(self, key, subkey, in_path_none=False):
         """Get the current value of the option.
@@ -105,20 +210,20 @@ class Config(object):
                 requested.
         """
         key, subkey = _lower_keys(key, subkey)
-        _entry_must_exist(self.gc, key, subkey)
-
-        df = self.gc[(self.gc["k1"] == key) & (self.gc["k2"] == subkey)]
-        if df["type"].values[0] == "bool":
-            return bool(df["value"].values[0])
-        elif df["type"].values[0] == "int":
-            return int(df["value"].values[0])
-        elif df["type"].values[0] == "path_in":
-            if df["value"].values[0] is None and not in_path_none:
+        pos = self._position(key, subkey)
+
+        _type, value = self._cell(pos, "type"), self._cell(pos, "value")
+        if _type == "bool":
+            return bool(value)
+        elif _type == "int":
+            return int(value)
+        elif _type == "path_in":
+            if value is None and not in_path_none:
                 raise ValueError('Unspecified path for {0}.{1}'.format(key,
                                                                        subkey))
-            return df["value"].values[0]
+            return value
         else:
-            return df["value"].values[0]
+            return value
 
     def get_option_default(self, key, subkey):
         """Get the default value of the option.
@@ -133,15 +238,15 @@ class Config(object):
                 any option.
         """
         key, subkey = _lower_keys(key, subkey)
-        _entry_must_exist(self.gc, key, subkey)
+        pos = self._position(key, subkey)
 
-        df = self.gc[(self.gc["k1"] == key) & (self.gc["k2"] == subkey)]
-        if df["type"].values[0] == "bool":
-            return bool(df["default"].values[0])
-        elif df["type"].values[0] == "int":
-            return int(df["default"].values[0])
+        _type, default = self._cell(pos, "type"), self._cell(pos, "default")
+        if _type == "bool":
+            return bool(default)
+        elif _type == "int":
+            return int(default)
         else:
-            return df["default"].values[0]
+            return default
 
     def get_option_description(self, key, subkey):
         """Get the string describing a particular option.
@@ -156,10 +261,7 @@ class Config(object):
                 option.
         """
         key, subkey = _lower_keys(key, subkey)
-        _entry_must_exist(self.gc, key, subkey)
-
-        return self.gc[(self.gc["k1"] == key) &
-                       (self.gc["k2"] == subkey)]["description"].values[0]
+        return self._cell(self._position(key, subkey), "description")
 
     def get_option_type(self, key, subkey):
         """Get the type of a particular option.
@@ -174,10 +276,7 @@ class Config(object):
                 option.
         """
         key, subkey = _lower_keys(key, subkey)
-        _entry_must_exist(self.gc, key, subkey)
-
-        return self.gc[(self.gc["k1"] == key) &
-                       (self.gc["k2"] == subkey)]["type"].values[0]
+        return self._cell(self._position(key, subkey), "type")
 
     def get_option_alternatives(self, key, subkey):
         """Get list of available values for an option.
@@ -193,10 +292,7 @@ class Config(object):
                 option.
         """
         key, subkey = _lower_keys(key, subkey)
-        _entry_must_exist(self.gc, key, subkey)
-
-        return self.gc[(self.gc["k1"] == key) &
-                       (self.gc["k2"] == subkey)]["values"].values[0]
+        return self._cell(self._position(key, subkey), "values")
 
     def set_option(self, key, subkey, value):
         """Sets the value of an option.
@@ -215,19 +311,210 @@ class Config(object):
                 available values for the option.
         """
         key, subkey = _lower_keys(key, subkey)
-        _entry_must_exist(self.gc, key, subkey)
+        self._set_options({(key, subkey): value})
 
-        df = self.gc[(self.gc["k1"] == key) & (self.gc["k2"] == subkey)]
-        if df["locked"].values[0]:
-            raise ValueError("{0}.{1} option is locked".format(key, subkey))
-        ev.value_eval(value, df["type"].values[0])
-        if not self.check_option(key, subkey, value):
-            info = "{0}.{1} accepted options are: ".format(key, subkey)
-            info += "[{}]".format(", ".join(df["values"].values[0]))
-            raise ValueError(info)
-        self.gc.loc[
-            (self.gc["k1"] == key) &
-            (self.gc["k2"] == subkey), "value"] = value
+    def _get_index(self):
+        """Map each option to its row in the registry.
+
+        The index, the tree of sections used for nested keys and the
+        secondary indexes by type and locked status are built from the
+        registry when needed. Registering or locking options updates them;
+        other changes to the registry discard them.
+
+        :return: :class:`dict` of (``key``, ``subkey``) to row position.
+        """
+        if self._index is None:
+            self._index, self._tree = {}, {}
+            self._types, self._locked = {}, set()
+            rows = zip(self.gc["k1"].values, self.gc["k2"].values,
+                       self.gc["type"].values, self.gc["locked"].values)
+            for i, (key, subkey, _type, locked) in enumerate(rows):
+                self._index_option(key, subkey, i, _type, locked)
+        return self._index
+
+    def _index_option(self, key, subkey, position, _type, locked):
+        """Add an option to the indexes."""
+        self._index[(key, subkey)] = position
+        _tree_insert(self._tree, key, subkey)
+        self._types.setdefault(_type.lower(), set()).add((key, subkey))
+        if locked:
+            self._locked.add((key, subkey))
+        self._validators = {}
+
+    def _reset_index(self):
+        """Discard the indexes after rows are removed or replaced."""
+        self._index = self._tree = self._types = self._locked = None
+        self._validators = {}
+
+    def _position(self, key, subkey):
+        """Row of an option in the registry. Keys have to be lower case."""
+        index = self._get_index()
+        _entry_must_exist(index, key, subkey)
+        return index[(key, subkey)]
+
+    def _cell(self, position, column):
+        """Value of a column of the registry for a given row."""
+        return self.gc.iat[position, self.clmn.index(column)]
+
+    def _locate(self, keys):
+        """Find the registry row of multiple options.
+
+        :param keys: (``key``, ``subkey``) pairs, already lower case.
+
+        :return: :func:`list` of row positions, in the order of ``keys``.
+
+        :raise:
+            :NotRegisteredError: If any option is not registered.
+        """
+        index = self._get_index()
+        positions = []
+        for key, subkey in keys:
+            _entry_must_exist(index, key, subkey)
+            positions.append(index[(key, subkey)])
+        return positions
+
+    def list_options(self, key=""):
+        """List the options in a section, including nested sections.
+
+        :param str key: Section to list, with nested sections separated by
+            dots. If not provided, all options are listed.
+
+        :return: :func:`list` of (``key``, ``subkey``), in the order in
+            which they were registered.
+        """
+        key, _ = _lower_keys(key, '')
+        index = self._get_index()
+        if key == "":
+            keys = list(index)
+        else:
+            keys = _tree_leaves(self._tree, key)
+        return sorted(keys, key=index.get)
+
+    def query(self, pattern=None, _type=None, locked=None, regex=False):
+        """Find options by name, type or locked status.
+
+        Candidates are first selected through the indexes of sections,
+        types and locked options; only those are matched against
+        ``pattern``.
+
+        :param str pattern: Pattern to match against the full name of the
+            option (``key.subkey``). A glob pattern (``solver.*tol*``)
+            unless ``regex`` is :data:`True`.
+        :param str _type: Only options of this type.
+        :param bool locked: Only locked (:data:`True`) or unlocked
+            (:data:`False`) options.
+        :param bool regex: Interpret ``pattern`` as a regular expression,
+            which has to match the whole name.
+
+        :return: :func:`list` of :class:`.OptionView` - named tuples with
+            the data of each option, in the order in which they were
+            registered.
+        """
+        index = self._get_index()
+        candidates = None
+        if pattern is not None and not regex:
+            pattern = pattern.lower()
+            prefix = re.split(r"[*?\[]", pattern)[0].rpartition(".")[0]
+            if prefix != "":
+                candidates = set(_tree_leaves(self._tree, prefix))
+        if _type is not None:
+            selected = self._types.get(_type.lower(), set())
+            candidates = selected if candidates is None \
+                else candidates & selected
+        if locked is True:
+            candidates = self._locked if candidates is None \
+                else candidates & self._locked
+        if candidates is None:
+            candidates = index
+        if locked is False:
+            candidates = set(candidates) - self._locked
+
+        if pattern is not None:
+            expression = "(?:{})\\Z".format(pattern) if regex \
+                else fnmatch.translate(pattern)
+            match = re.compile(expression, re.IGNORECASE).match
+            candidates = [k for k in candidates
+                          if match("{0}.{1}".format(*k))]
+        rows = sorted(index[k] for k in candidates)
+        return [OptionView(*[self.gc.iat[i, j] for j in range(len(self.clmn))])
+                for i in rows]
+
+    def _get_values(self, keys):
+        """Get the raw current value of multiple options.
+
+        :param keys: (``key``, ``subkey``) pairs, already lower case.
+
+        :return: :class:`~collections.OrderedDict` of (``key``, ``subkey``)
+            to value.
+        """
+        column = self.gc["value"].values
+        return OrderedDict(zip(keys, [column[i]
+                                      for i in self._locate(keys)]))
+
+    def _set_options(self, changes, validate=True, source=None):
+        """Validate and apply multiple option values together.
+
+        The registry is scanned only once to locate all the targeted
+        options and no value is applied until all of them have been
+        validated.
+
+        :param changes: Values to assign to each option.
+        :type changes: :class:`dict` of (``key``, ``subkey``) to value
+        :param bool validate: When :data:`False`, values are written as
+            they are, ignoring locks. Only meant to restore values that
+            were previously obtained from the registry.
+        :param str source: What makes the change, for the audit log.
+            Defaults to ``set_option``, or to the file being loaded.
+
+        :raise:
+            :NotRegisteredError: If any option is not registered.
+            :ValueError: If any option is locked or any value is not
+                valid for its option.
+        """
+        if len(changes) == 0:
+            return
+        positions = self._locate(changes.keys())
+        types, locked = self.gc["type"].values, self.gc["locked"].values
+        values, shapes = self.gc["values"].values, self.gc["shape"].values
+        profile = self._load_profile
+
+        staged = []
+        for i, ((key, subkey), value) in zip(positions, changes.items()):
+            if not validate:
+                staged.append((i, value))
+                continue
+            if profile is not None:
+                start = default_timer()
+            if locked[i]:
+                raise ValueError("{0}.{1} option is locked".format(key,
+                                                                   subkey))
+            ev.value_eval(value, types[i])
+            ev.shape_eval(value, shapes[i])
+            if not ev.value_in(value, values[i], types[i]):
+                info = "{0}.{1} accepted options are: ".format(key, subkey)
+                info += "[{}]".format(", ".join([str(x) for x in values[i]]))
+                raise ValueError(info)
+            staged.append((i, ev.cast(value, types[i])))
+            if profile is not None:
+                profile.add('validate', default_timer() - start, types[i])
+
+        column = self.clmn.index("value")
+        audit = self._audit
+        if audit is not None:
+            source = source or self._audit_source or 'set_option'
+        for i, value in staged:
+            if profile is not None:
+                start = default_timer()
+            key, subkey = self.gc["k1"].values[i], self.gc["k2"].values[i]
+            old = self.gc.iat[i, column]
+            self._log_undo('value', key, subkey, old)
+            self.gc.iat[i, column] = value
+            if audit is not None:
+                audit.append(AuditRecord(_monotonic(), key, subkey, old,
+                                         value, source))
+            if profile is not None:
+                profile.add('apply', default_timer() - start, types[i])
+        self._changed(changes.keys())
 
     def check_option(self, key, subkey, value):
         """Evaluate if a given value fits the option.
@@ -246,15 +533,16 @@ class Config(object):
                 option.
             :ValueError: If the provided value is not the expected
                 type for the option.
+            :ValueError: If the provided value does not have the expected
+                shape for the option.
         """
         key, subkey = _lower_keys(key, subkey)
-        _entry_must_exist(self.gc, key, subkey)
+        pos = self._position(key, subkey)
 
-        df = self.gc[(self.gc["k1"] == key) & (self.gc["k2"] == subkey)]
-        ev.value_eval(value, df["type"].values[0])
-        if df["values"].values[0] is not None:
-            return value in df["values"].values[0]
-        return True
+        _type = self._cell(pos, "type")
+        ev.value_eval(value, _type)
+        ev.shape_eval(value, self._cell(pos, "shape"))
+        return ev.value_in(value, self._cell(pos, "values"), _type)
 
     def reset_option(self, key, subkey):
         """Resets a single option to the default values.
@@ -271,15 +559,15 @@ class Config(object):
             return
 
         key, subkey = _lower_keys(key, subkey)
-        _entry_must_exist(self.gc, key, subkey)
+        pos = self._position(key, subkey)
 
-        df = self.gc[(self.gc["k1"] == key) & (self.gc["k2"] == subkey)]
-        if df["locked"].values[0]:
+        if self._cell(pos, "locked"):
             raise ValueError("{0}.{1} option is locked".format(key, subkey))
-        val = df["default"].values[0]
-        self.gc.loc[
-            (self.gc["k1"] == key) &
-            (self.gc["k2"] == subkey), "value"] = val
+        old, default = self._cell(pos, "value"), self._cell(pos, "default")
+        self._log_undo('value', key, subkey, old)
+        self.gc.iat[pos, self.clmn.index("value")] = default
+        self._audit_change(key, subkey, old, default, 'reset')
+        self._changed([(key, subkey)])
 
     def lock_option(self, key, subkey):
         """Make an option unmutable.
@@ -292,11 +580,12 @@ class Config(object):
                 option.
         """
         key, subkey = _lower_keys(key, subkey)
-        _entry_must_exist(self.gc, key, subkey)
+        pos = self._position(key, subkey)
 
-        self.gc.loc[
-            (self.gc["k1"] == key) &
-            (self.gc["k2"] == subkey), "locked"] = True
+        self._log_undo('locked', key, subkey, self._cell(pos, "locked"))
+        self.gc.iat[pos, self.clmn.index("locked")] = True
+        self._locked.add((key, subkey))
+        self._changed([(key, subkey)])
 
     def lock_configuration(self):
         """Do not allow calls that should not be accessible by the user.
@@ -304,24 +593,41 @@ class Config(object):
         This includes :meth:`.Config.register_option` and
         :meth:`.Config.unregister_option`.
         """
+        self._log_undo('open', self.open)
         self.open = False
 
-    def show_options(self, key=""):
-        """Returns a copy the options :class:`~pandas.DataFrame`.
+    def show_options(self, key="", copy=False):
+        """Returns the options :class:`~pandas.DataFrame`.
 
         Called on jupyter notebook, it will print them in pretty
         :class:`~pandas.DataFrame` format.
 
+        The options are read from the registry when first requested and
+        reused until they change: each call returns a shallow copy of them.
+        Its columns and rows can be changed, but its cells cannot be
+        assigned; ask for a ``copy`` to modify them.
+
         :param str key: First identifier of the option. If not provided,
-            all options are returned.
+            all options are returned. Options in nested sections of ``key``
+            are included.
+        :param bool copy: Return a modifiable copy.
 
         :return: :class:`~pandas.DataFrame`
         """
         key, _ = _lower_keys(key, '')
 
-        if key == "":
-            return self.gc.copy()
-        return self.gc[(self.gc["k1"] == key)].copy()
+        generation = self.get_generation()
+        if self._views is None or self._views[0] != generation:
+            self._views = (generation, {})
+        frame = self._views[1].get(key)
+        if frame is None:
+            if key == "":
+                frame = _frozen_frame(self.gc)
+            else:
+                positions = self._locate(self.list_options(key))
+                frame = _frozen_frame(self.gc.iloc[positions])
+            self._views[1][key] = frame
+        return frame.copy(deep=copy)
 
     def reset_options(self, empty=True):
         """Empty ALL options.
@@ -331,110 +637,703 @@ class Config(object):
 
         This function skips ``locked`` control.
         """
+        keys = zip(self.gc["k1"].values, self.gc["k2"].values)
         if empty:
+            self._log_undo('frame', self.gc)
             self.gc = pd.DataFrame(columns=self.clmn)
+            self._reset_index()
         else:
+            old = self.gc["value"].values.copy()
+            if self._journals:
+                self._log_undo('column', old)
             self.gc["value"] = self.gc["default"]
+            self._audit_column(old, 'reset')
+        self._changed(keys)
 
-    def set_options_from_YAML(self, filename):
+    def set_options_from_YAML(self, filename, strict=False):
         """Load options from a YAML-formated file.
 
         :param str filename: File from which to load the options.
+        :param bool strict: Validate the whole file before loading it (see
+            :meth:`.Config.set_options_from_dict`).
+
+        :return: :class:`.LoadProfile` - if loads are profiled (see
+            :meth:`.Config.profile_loads`).
 
         :raise:
             :IOError: If ``filename`` does not exist.
         """
-        if not os.path.isfile(filename):
-            raise IOError("File {0} not found".format(filename))
-        stream = open(filename)
-        data_dict = yaml.safe_load(stream)
-        self.set_options_from_dict(data_dict, filename)
+        return self._set_options_from_text(filename, yaml.safe_load,
+                                           strict=strict)
 
-    def set_options_from_JSON(self, filename):
-        """Load options from a YAML-formated file.
+    def set_options_from_JSON(self, filename, strict=False):
+        """Load options from a JSON-formated file.
 
         :param str filename: File from which to load the options.
+        :param bool strict: Validate the whole file before loading it (see
+            :meth:`.Config.set_options_from_dict`).
+
+        :return: :class:`.LoadProfile` - if loads are profiled (see
+            :meth:`.Config.profile_loads`).
 
         :raise:
             :IOError: If ``filename`` does not exist.
         """
+        return self._set_options_from_text(filename, json.loads,
+                                           strict=strict)
+
+    def set_options_from_TOML(self, filename, strict=False):
+        """Load options from a TOML-formated file.
+
+        Requires :mod:`tomllib` (python 3.11+) or the ``tomli`` or ``toml``
+        packages.
+
+        :param str filename: File from which to load the options.
+        :param bool strict: Validate the whole file before loading it (see
+            :meth:`.Config.set_options_from_dict`).
+
+        :return: :class:`.LoadProfile` - if loads are profiled (see
+            :meth:`.Config.profile_loads`).
+
+        :raise:
+            :IOError: If ``filename`` does not exist.
+            :ImportError: If no TOML parser is available.
+        """
+        if toml is None:
+            raise ImportError("Reading TOML files requires the tomli or "
+                              "toml packages")
+        return self._set_options_from_text(filename, toml.loads,
+                                           strict=strict)
+
+    def set_options_from_INI(self, filename, strict=False):
+        """Load options from an INI-formated file.
+
+        Each section is the first identifier of its options (nested
+        sections are dotted, as in ``[solver.linear]``). Values are read
+        according to the type of their option; arrays can be written as
+        JSON lists or comma-separated values, and strings can be quoted.
+
+        :param str filename: File from which to load the options.
+        :param bool strict: Validate the whole file before loading it (see
+            :meth:`.Config.set_options_from_dict`).
+
+        :return: :class:`.LoadProfile` - if loads are profiled (see
+            :meth:`.Config.profile_loads`).
+
+        :raise:
+            :IOError: If ``filename`` does not exist.
+        """
+        return self._set_options_from_text(filename, _parse_ini, True,
+                                           strict)
+
+    def set_options_from_ENV(self, filename, strict=False):
+        """Load options from a dotenv file.
+
+        Each variable is named after the identifiers of its option,
+        separated by double underscores (``SOLVER__LINEAR__TOLERANCE``
+        for ``solver.linear`` ``tolerance``). Names are not case
+        sensitive. Values are read as in :meth:`.Config.set_options_from_INI`.
+
+        :param str filename: File from which to load the options.
+        :param bool strict: Validate the whole file before loading it (see
+            :meth:`.Config.set_options_from_dict`).
+
+        :return: :class:`.LoadProfile` - if loads are profiled (see
+            :meth:`.Config.profile_loads`).
+
+        :raise:
+            :IOError: If ``filename`` does not exist.
+        """
+        return self._set_options_from_text(filename, _parse_env, True,
+                                           strict)
+
+    def _set_options_from_text(self, filename, parse, from_text=False,
+                               strict=False):
+        """Load options from a file with the given parser.
+
+        :param parse: Function that makes a :class:`dict` from the text of
+            the file.
+        :param bool from_text: The parser only provides text, which has to
+            be read according to the type of each option.
+        """
         if not os.path.isfile(filename):
             raise IOError("File {0} not found".format(filename))
-        data_str = "".join([x.strip() for x in open(filename).readlines()])
-        data_dict = json.loads(data_str)
-        self.set_options_from_dict(data_dict, filename)
-
-    def set_options_from_file(self, filename, file_format='yaml'):
+        with self._profiled_load(filename) as profile:
+            start = default_timer()
+            with open(filename) as stream:
+                data_str = stream.read()
+            if profile is not None:
+                profile.add('read', default_timer() - start)
+                start = default_timer()
+            data_dict = parse(data_str)
+            if from_text:
+                index = self._get_index()
+                for k, section in data_dict.items():
+                    for sk, text in section.items():
+                        if (k, sk) in index:
+                            section[sk] = ev.from_text(text, self._cell(
+                                index[(k, sk)], "type"))
+            if profile is not None:
+                profile.add('parse', default_timer() - start)
+            self.set_options_from_dict(data_dict, filename, strict)
+        return profile
+
+    def set_options_from_file(self, filename, file_format=None,
+                              strict=False):
         """Load options from file.
 
-        This is a wrapper over :func:`.set_options_from_JSON` and
-        :func:`.set_options_from_YAML`.
+        This is a wrapper over :func:`.set_options_from_YAML`,
+        :func:`.set_options_from_JSON`, :func:`.set_options_from_TOML`,
+        :func:`.set_options_from_INI` and :func:`.set_options_from_ENV`.
 
         :param str filename: File from which to load the options.
-        :param str file_format: File format (``yaml`` or ``json``).
+        :param str file_format: File format (``yaml``, ``json``, ``toml``,
+            ``ini`` or ``env``). If not provided, it is guessed from the
+            extension of ``filename`` (``.yml``, ``.yaml``, ``.json``,
+            ``.toml``, ``.ini`` and ``.env``), defaulting to ``yaml``.
+        :param bool strict: Validate the whole file before loading it (see
+            :meth:`.Config.set_options_from_dict`).
+
+        :return: :class:`.LoadProfile` - if loads are profiled (see
+            :meth:`.Config.profile_loads`).
 
         :raises:
             :ValueError: If an unknown ``format`` is requested.
         """
-        if file_format.lower() == 'yaml':
-            return self.set_options_from_YAML(filename)
-        elif file_format.lower() == 'json':
-            return self.set_options_from_JSON(filename)
-        else:
+        if file_format is None:
+            file_format = _file_format(filename)
+        if file_format.lower() not in _FILE_FORMATS:
             raise ValueError('Unknown format {}'.format(file_format))
+        return getattr(self, 'set_options_from_' +
+                       _FILE_FORMATS[file_format.lower()])(filename,
+                                                           strict=strict)
 
-    def set_options_from_dict(self, data_dict, filename=None):
+    def set_options_from_dict(self, data_dict, filename=None, strict=False):
         """Load options from a dictionary.
 
+        Options in nested sections can be provided either as nested
+        dictionaries or with the dotted section name as key.
+
+        By default, values that are not valid for their option or that
+        target locked options are skipped. With ``strict``, all the values
+        are validated first (see :meth:`.Config.compile_validator`) and
+        nothing is loaded if any of them is rejected.
+
         :param dict data_dict: Dictionary with the options to load.
         :param str filename: If provided, assume that non-absolute
             paths provided are in reference to the file.
+        :param bool strict: Reject the whole dictionary if any value is
+            not valid.
+
+        :return: :class:`.LoadProfile` - if loads are profiled (see
+            :meth:`.Config.profile_loads`).
+
+        :raise:
+            :ValueError: If ``strict`` and any value is rejected; the
+                message lists all of them.
         """
-        if filename is not None:
-            filename = os.path.dirname(filename)
         for k in data_dict:
             if not isinstance(data_dict[k], dict):
                 raise ValueError("The input data has to be a dict of dict")
-            for sk in data_dict[k]:
-                if self.gc[(self.gc["k1"] == k) &
-                           (self.gc["k2"] == sk)].shape[0] == 0:
+        if strict:
+            errors = self.compile_validator()(data_dict, filename)
+            if errors:
+                raise ValueError("Invalid options{0}:\n  {1}".format(
+                    " in {}".format(filename) if filename else "",
+                    "\n  ".join(errors)))
+        source = filename
+        unmatched = []
+        audit_source = self._audit_source
+        with self._profiled_load(filename) as profile:
+            if filename is not None:
+                filename = os.path.dirname(filename)
+            self._audit_source = audit_source or source or 'dict'
+            try:
+                with self._coalesce():
+                    for k in data_dict:
+                        unmatched.extend(self._set_options_from_dict(
+                            k, data_dict[k], filename))
+            finally:
+                self._audit_source = audit_source
+        if self._tracing:
+            for k in unmatched:
+                sources = self._unmatched.setdefault(k, [])
+                if source not in sources:
+                    sources.append(source)
+        return profile
+
+    def _set_options_from_dict(self, k, data_dict, filename):
+        """Load the options of section ``k`` and its nested sections.
+
+        :return: :func:`list` of (``key``, ``subkey``) - values that do not
+            match any option.
+        """
+        index = self._get_index()
+        profile = self._load_profile
+        unmatched = []
+        for sk in data_dict:
+            value = data_dict[sk]
+            if (k, sk) not in index:
+                if isinstance(value, dict):
+                    unmatched.extend(self._set_options_from_dict(
+                        ".".join([k, sk]), value, filename))
+                else:
+                    unmatched.append((k, sk))
+                continue
+            if profile is not None:
+                profile.options += 1
+                start = default_timer()
+            if isinstance(value, six.string_types):
+                value = str(value)
+            _type = self._cell(index[(k, sk)], "type")
+            if not ev.is_array_type(_type):
+                # arrays are validated before being casted
+                value = ev.cast(value, _type)
+            if profile is not None:
+                profile.add('cast', default_timer() - start, _type)
+            # loading is not an access to trace or instrument
+            current = type(self).get_option(self, k, sk, True)
+            try:
+                # arrays that numpy cannot compare are not valid either
+                if not ev.is_equal(current, value, _type):
+                    self.set_option(k, sk, value)
+            # Provided paths do not work: try add them relative
+            # to the config file
+            except IOError:
+                if filename is None:
+                    raise IOError('Error path: {0}.{1}'.format(k, sk))
+                npat = os.path.join(filename, value)
+                self.set_option(k, sk, os.path.normpath(npat))
+            except ValueError:
+                pass  # locked options will not be changed
+        return unmatched
+
+    def compile_validator(self, allow_unknown=True):
+        """Make a function that validates dictionaries of options.
+
+        The returned function takes the same arguments as
+        :meth:`.Config.set_options_from_dict` (``data_dict`` and an optional
+        ``filename``) and returns the :func:`list` of errors found in all of
+        ``data_dict``, without loading anything. Values are checked as
+        loading would do: they have to be valid for their option, and
+        locked options only accept their current value.
+
+        The checks of each option are prepared once and the validator is
+        kept by the configuration: compile it again after registering or
+        unregistering options.
+
+        :param bool allow_unknown: When :data:`False`, values that do not
+            match any option are errors too.
+
+        :return: :func:`callable`
+        """
+        validator = self._validators.get(allow_unknown)
+        if validator is not None:
+            return validator
+        rows = zip(self.gc["k1"].values, self.gc["k2"].values,
+                   self.gc["type"].values, self.gc["values"].values,
+                   self.gc["shape"].values)
+        checks = {(k1, k2): _compile_check(_type, values, shape)
+                  for k1, k2, _type, values, shape in rows}
+        column = self.clmn.index("value")
+
+        def validate_section(k, data_dict, index, directory, errors):
+            for sk, value in data_dict.items():
+                check = checks.get((k, sk)) if (k, sk) in index else None
+                if check is None:
+                    if isinstance(value, dict):
+                        validate_section(".".join([k, sk]), value, index,
+                                         directory, errors)
+                    elif not allow_unknown:
+                        errors.append("{0}.{1}: unknown option".format(k, sk))
+                    continue
+                current = self.gc.iat[index[(k, sk)], column]
+                error = check(value, current, (k, sk) in self._locked,
+                              directory)
+                if error is not None:
+                    errors.append("{0}.{1}: {2}".format(k, sk, error))
+
+        def validate(data_dict, filename=None):
+            directory = None if filename is None else \
+                os.path.dirname(filename)
+            index, errors = self._get_index(), []
+            for k, section in data_dict.items():
+                if not isinstance(section, dict):
+                    errors.append("{}: section has to be a dict".format(k))
                     continue
-                if isinstance(data_dict[k][sk], six.string_types):
-                    data_dict[k][sk] = str(data_dict[k][sk])
-                _type = self.gc[(self.gc["k1"] == k) &
-                                (self.gc["k2"] == sk)][["type"]].values[0]
-                data_dict[k][sk] = ev.cast(data_dict[k][sk], _type)
-                if self.get_option(k, sk, True) != data_dict[k][sk]:
-                    try:
-                        self.set_option(k, sk, data_dict[k][sk])
-                    # Provided paths do not work: try add them relative
-                    # to the config file
-                    except IOError:
-                        if filename is None:
-                            raise IOError('Error path: {0}.{1}'.format(k, sk))
-                        npat = os.path.join(filename, data_dict[k][sk])
-                        self.set_option(k, sk, os.path.normpath(npat))
-                    except ValueError:
-                        pass  # locked options will not be changed
-
-    def write_options_to_file(self, filename, file_format='yaml'):
+                validate_section(k, section, index, directory, errors)
+            return errors
+
+        self._validators[allow_unknown] = validate
+        return validate
+
+    def to_json_schema(self, allow_unknown=True):
+        """Describe the configuration files accepted as a JSON Schema.
+
+        Nested sections are nested objects. Each option is described by its
+        type, accepted values, shape (for arrays), default value and
+        definition; locked options are ``readOnly`` and only accept their
+        current value. Elements of arrays registered without ``shape`` can
+        be nested to any depth, through recursive ``definitions``. Strings
+        are accepted as they are for text and path types: the schema
+        cannot check that ``path_in`` files exist.
+
+        :param bool allow_unknown: When :data:`False`, objects do not
+            accept properties that are not options or sections.
+
+        :return: :class:`dict` - JSON Schema (draft 7).
+        """
+        schema = {"$schema": "http://json-schema.org/draft-07/schema#"}
+        schema.update(_schema_section(allow_unknown))
+        definitions = {}
+        rows = zip(self.gc["k1"].values, self.gc["k2"].values,
+                   self.gc["value"].values, self.gc["type"].values,
+                   self.gc["default"].values, self.gc["locked"].values,
+                   self.gc["description"].values, self.gc["values"].values,
+                   self.gc["shape"].values)
+        for k1, k2, value, _type, default, locked, description, values, \
+                shape in rows:
+            section = schema
+            for k in k1.split("."):
+                section = section["properties"].setdefault(
+                    k, _schema_section(allow_unknown))
+            option = _schema_type(_type, values, shape, definitions,
+                                  "{0}.{1}".format(k1, k2))
+            option["description"] = description
+            option["default"] = _json_value(default)
+            if locked:
+                option["readOnly"] = True
+                option["const"] = _json_value(value)
+            section["properties"][k2] = option
+        if definitions:
+            schema["definitions"] = definitions
+        return schema
+
+    def profile_loads(self, enabled=True):
+        """Time the stages of loading options from files and dictionaries.
+
+        While enabled, or while there are hooks added with
+        :meth:`.Config.add_load_hook`, the loaders return a
+        :class:`.LoadProfile` with the time spent reading, parsing,
+        casting, validating and applying the options.
+
+        :param bool enabled: Start (:data:`True`) or stop (:data:`False`)
+            profiling.
+        """
+        self._profile_loads = enabled
+
+    def add_load_hook(self, callback):
+        """Get the :class:`.LoadProfile` of every load.
+
+        ``callback`` is called with the profile once a load finishes
+        successfully. Loads are profiled while there is any hook.
+
+        :param callback: Function to call after each load.
+
+        :return: :class:`int` - identifier to use with
+            :meth:`.Config.remove_load_hook`.
+        """
+        hook = next(self._subscription_ids)
+        self._load_hooks[hook] = callback
+        return hook
+
+    def remove_load_hook(self, hook):
+        """Stop calling a hook added with :meth:`.Config.add_load_hook`.
+
+        :param int hook: Identifier returned by
+            :meth:`.Config.add_load_hook`.
+        """
+        self._load_hooks.pop(hook, None)
+
+    @contextmanager
+    def _profiled_load(self, source):
+        """Profile the loading done inside the ``with`` statement.
+
+        Provides the :class:`.LoadProfile` being collected, or :data:`None`
+        if loads are not profiled. Nested loads share the outer profile.
+        """
+        profile = self._load_profile
+        if profile is not None or not (self._profile_loads or
+                                       self._load_hooks):
+            yield profile
+            return
+        profile = self._load_profile = LoadProfile(source)
+        start = default_timer()
+        try:
+            yield profile
+        finally:
+            self._load_profile = None
+        profile.total = default_timer() - start
+        self._loads += 1
+        self._load_totals.total += profile.total
+        self._load_totals.options += profile.options
+        for stage, elapsed in profile.stages.items():
+            self._load_totals.add(stage, elapsed)
+        for callback in list(self._load_hooks.values()):
+            callback(profile)
+
+    def diff(self, other):
+        """Compare the options of two configurations.
+
+        :param other: Configuration to compare with.
+        :type other: :class:`.Config`
+
+        :return: :class:`.ConfigDiff` - named tuple with the options
+            only in ``other`` (``added``), only in this configuration
+            (``removed``) and a :class:`~collections.OrderedDict` of the
+            options whose value (or type) differ (``changed``), mapped to
+            their (current, other) values.
+        """
+        mine, theirs = self._get_index(), other._get_index()
+        values, types = self.gc["value"].values, self.gc["type"].values
+        other_values = other.gc["value"].values
+        other_types = other.gc["type"].values
+
+        removed, changed = [], OrderedDict()
+        for i, k in enumerate(zip(self.gc["k1"].values,
+                                  self.gc["k2"].values)):
+            if k not in theirs:
+                removed.append(k)
+                continue
+            j = theirs[k]
+            if types[i] != other_types[j] or \
+               not ev.is_equal(values[i], other_values[j], types[i]):
+                changed[k] = (values[i], other_values[j])
+        added = [k for k in zip(other.gc["k1"].values, other.gc["k2"].values)
+                 if k not in mine]
+        return ConfigDiff(added, removed, changed)
+
+    def merge(self, other, policy='update'):
+        """Apply the option values of another configuration.
+
+        Values are validated and applied together, as in
+        :meth:`.Config.batch`. Locked options are skipped. If the merge
+        fails, the configuration is left unchanged.
+
+        :param other: Configuration to take values from.
+        :type other: :class:`.Config`
+        :param str policy: How to merge:
+
+            * ``update``: take the values of ``other`` for all shared
+              options.
+            * ``keep``: only take the values of ``other`` for options that
+              still have their default value here.
+            * ``strict``: as ``update``, but fail if ``other`` has options
+              not registered here or values for locked options.
+            * ``register``: as ``update``, and also register the options
+              that are only in ``other``.
+
+        :return: :func:`list` of (``key``, ``subkey``) - changed options.
+
+        :raise:
+            :ValueError: If ``policy`` is unknown.
+            :NotRegisteredError: If ``policy`` is ``strict`` and ``other``
+                has unknown options.
+            :ValueError: If ``policy`` is ``strict`` and a locked option
+                would change, or if any value is not valid.
+        """
+        if policy not in ('update', 'keep', 'strict', 'register'):
+            raise ValueError('Unknown merge policy {}'.format(policy))
+        differences = self.diff(other)
+        if policy == 'strict' and differences.added:
+            raise NotRegisteredError("Options not registered: {}".format(
+                ", ".join("{0}.{1}".format(*k) for k in differences.added)))
+
+        index = self._get_index()
+        changes = OrderedDict()
+        for k, (value, other_value) in differences.changed.items():
+            if k in self._locked:
+                if policy == 'strict':
+                    raise ValueError("{0}.{1} option is locked".format(*k))
+                continue
+            if policy == 'keep' and \
+               not ev.is_equal(value, self._cell(index[k], "default"),
+                               self._cell(index[k], "type")):
+                continue
+            changes[k] = other_value
+
+        # options registered before a failure are removed again
+        with self._coalesce(), self.transaction():
+            locked = []
+            if policy == 'register':
+                for k in differences.added:
+                    row = dict(zip(other.clmn, [
+                        other._cell(other._position(*k), c)
+                        for c in other.clmn]))
+                    self.register_option(k[0], k[1], row["default"],
+                                         row["type"], row["description"],
+                                         row["values"], shape=row["shape"])
+                    changes[k] = row["value"]
+                    if row["locked"]:
+                        locked.append(k)
+            self._set_options(changes, source='merge')
+            for k in locked:
+                self.lock_option(*k)
+        return list(changes)
+
+    def snapshot(self):
+        """Record the current option values.
+
+        Snapshots are immutable and only store the options that changed
+        since the previous snapshot, sharing the rest with it; taking a
+        snapshot of an unchanged configuration returns the previous one.
+
+        .. ipython::
+
+            In [1]: from libconfig import Config
+               ...: c = Config()
+               ...: c.register_option('opt', 'on', 1, 'int', 'option 1')
+               ...: snap = c.snapshot()
+               ...: c.set_option('opt', 'on', 10)
+               ...: print('snapshot', snap.get('opt', 'on'))
+               ...: c.restore(snap)
+               ...: print('restored', c.get_option('opt', 'on'))
+
+        :return: :class:`.Snapshot`
+        """
+        last = self._snapshot
+        if last is not None and not self._snapshot_dirty:
+            return last
+        index = self._get_index()
+        values, locked = self.gc["value"].values, self.gc["locked"].values
+        if last is None or last._depth >= _SNAPSHOT_DEPTH:
+            entries = dict((k, (values[i], bool(locked[i])))
+                           for k, i in index.items())
+            snap = Snapshot(None, entries, frozenset(index), self._generation)
+        else:
+            dirty = self._snapshot_dirty
+            # unregistered options are kept as None, for restore to find
+            # that they changed
+            entries = dict((k, (values[index[k]], bool(locked[index[k]]))
+                            if k in index else None) for k in dirty)
+            keys = last._keys
+            if any((k in index) != (k in keys) for k in dirty):
+                keys = frozenset(index)
+            snap = Snapshot(last, entries, keys, self._generation)
+        self._snapshot, self._snapshot_dirty = snap, set()
+        return snap
+
+    def restore(self, snapshot):
+        """Bring back the option values and locked status of a snapshot.
+
+        Only options changed since the snapshot are written when it was
+        taken from this configuration. Options registered after the
+        snapshot keep their current value.
+
+        :param snapshot: Snapshot to restore.
+        :type snapshot: :class:`.Snapshot`
+
+        :raise:
+            :NotRegisteredError: If an option of the snapshot is not
+                registered anymore. Nothing is restored then.
+        """
+        keys = set(self._snapshot_dirty)
+        node = self._snapshot
+        while node is not None and node is not snapshot:
+            keys.update(node._entries)
+            node = node._parent
+        if node is None:
+            keys = snapshot._keys
+        keys = [k for k in keys if k in snapshot._keys]
+
+        index = self._get_index()
+        for k in keys:
+            _entry_must_exist(index, *k)
+        value_column = self.clmn.index("value")
+        locked_column = self.clmn.index("locked")
+        changed = []
+        for k in keys:
+            value, locked = snapshot._entry(k)
+            pos = index[k]
+            current = self.gc.iat[pos, value_column]
+            if current is not value:
+                self._log_undo('value', k[0], k[1], current)
+                self.gc.iat[pos, value_column] = value
+                self._audit_change(k[0], k[1], current, value, 'restore')
+                changed.append(k)
+            current = self.gc.iat[pos, locked_column]
+            if bool(current) != locked:
+                self._log_undo('locked', k[0], k[1], current)
+                self.gc.iat[pos, locked_column] = locked
+                if locked:
+                    self._locked.add(k)
+                else:
+                    self._locked.discard(k)
+                changed.append(k)
+        if changed:
+            self._changed(changed)
+
+    def dump_option_values(self, changed_only=True):
+        """Get a compact, picklable representation of the option values.
+
+        Unlike pickling the :class:`.Config` itself, this does not carry the
+        option definitions, so it is meant to be sent to processes that
+        already registered the same options. Load it with
+        :meth:`.Config.set_options_from_values`.
+
+        :param bool changed_only: When :data:`True`, only options whose value
+            differs from their default are included.
+
+        :return: :class:`tuple`
+        """
+        rows = zip(self.gc["k1"].values, self.gc["k2"].values,
+                   self.gc["value"].values, self.gc["default"].values,
+                   self.gc["type"].values)
+        return (_STATE_VERSION, changed_only,
+                tuple((k1, k2, value) for k1, k2, value, default, _type in rows
+                      if not (changed_only and
+                              ev.is_equal(value, default, _type))))
+
+    def set_options_from_values(self, values):
+        """Load option values obtained with :meth:`.Config.dump_option_values`.
+
+        Values are not validated again and locks are skipped. If only the
+        changed values were dumped, all other options are set back to their
+        default value.
+
+        :param tuple values: Output of :meth:`.Config.dump_option_values`.
+
+        :raise:
+            :ValueError: If ``values`` come from an unknown format version.
+            :NotRegisteredError: If any of the options is not registered.
+        """
+        if values[0] != _STATE_VERSION:
+            raise ValueError("Unknown option values version "
+                             "{}".format(values[0]))
+        positions = self._locate([(k1, k2) for k1, k2, _ in values[2]])
+        column = self.gc["default" if values[1] else "value"].values.copy()
+        types = self.gc["type"].values
+        for i, (_, _, value) in zip(positions, values[2]):
+            column[i] = ev.cast(value, types[i])
+        old = self.gc["value"].values.copy()
+        if self._journals:
+            self._log_undo('column', old)
+        self.gc["value"] = column
+        self._audit_column(old, 'values')
+        self._changed(zip(self.gc["k1"].values, self.gc["k2"].values))
+
+    def write_options_to_file(self, filename, file_format=None):
         """Write options to file.
 
-        This is a wrapper over :func:`.write_options_to_JSON` and
-        :func:`.write_options_to_YAML`.
+        This is a wrapper over :func:`.write_options_to_YAML`,
+        :func:`.write_options_to_JSON`, :func:`.write_options_to_TOML`,
+        :func:`.write_options_to_INI` and :func:`.write_options_to_ENV`.
 
         :param str filename: Target file to write the options.
-        :param str file_format: File format (``yaml`` or ``json``).
+        :param str file_format: File format (``yaml``, ``json``, ``toml``,
+            ``ini`` or ``env``). If not provided, it is guessed from the
+            extension of ``filename``, as in
+            :meth:`.Config.set_options_from_file`.
 
         :raises:
             :ValueError: If an unknown ``format`` is requested.
         """
-        if file_format.lower() == 'yaml':
-            self.write_options_to_YAML(filename)
-        elif file_format.lower() == 'json':
-            self.write_options_to_JSON(filename)
-        else:
+        if file_format is None:
+            file_format = _file_format(filename)
+        if file_format.lower() not in _FILE_FORMATS:
             raise ValueError('Unknown format {}'.format(file_format))
+        getattr(self, 'write_options_to_' +
+                _FILE_FORMATS[file_format.lower()])(filename)
 
     def write_options_to_YAML(self, filename):
         """Writes the options in YAML format to a file.
@@ -455,31 +1354,149 @@ class Config(object):
                             separators=(',', ': ')))
         fd.close()
 
-    def document_options(self):
+    def write_options_to_TOML(self, filename):
+        """Writes the options in TOML format to a file.
+
+        TOML has no null value: options without value are not written.
+
+        :param str filename: Target file to write the options.
+        """
+        with open(filename, "w") as fd:
+            for line in _toml_lines(_options_to_dict(self.gc), []):
+                fd.write(line + "\n")
+
+    def write_options_to_INI(self, filename):
+        """Writes the options in INI format to a file.
+
+        Strings are quoted, so that they keep surrounding spaces and line
+        breaks.
+
+        :param str filename: Target file to write the options.
+        """
+        sections = OrderedDict()
+        for k1, k2, value in self.gc[["k1", "k2", "value"]].values:
+            if isinstance(value, six.string_types):
+                value = json.dumps(value)
+            sections.setdefault(k1, []).append("{0} = {1}".format(
+                k2, ev.to_text(value)))
+        with open(filename, "w") as fd:
+            fd.write("\n\n".join("[{0}]\n{1}".format(k, "\n".join(v))
+                                 for k, v in sections.items()) + "\n")
+
+    def write_options_to_ENV(self, filename):
+        """Writes the options as a dotenv file.
+
+        :param str filename: Target file to write the options.
+        """
+        with open(filename, "w") as fd:
+            for k1, k2, value in self.gc[["k1", "k2", "value"]].values:
+                if isinstance(value, six.string_types):
+                    value = json.dumps(value)
+                fd.write("{0}__{1}={2}\n".format(
+                    k1.replace(".", "__").upper(), k2.upper(),
+                    ev.to_text(value)))
+
+    def memory_report(self, by_section=False):
+        """Memory used by the options.
+
+        Sizes account for the objects referenced by each option (keys,
+        type, description, current and default values, alternative values
+        and shape), including their content. Objects shared between
+        options, such as repeated type names, are only counted the first
+        time they are found.
+
+        :param bool by_section: Add up the options of each section.
+
+        :return: :class:`~pandas.DataFrame` - bytes per option (or per
+            section), largest first.
+        """
+        columns = ['keys', 'type', 'description', 'value', 'default',
+                   'values', 'shape']
+        seen = set()
+        rows = []
+        for row in self.gc[["k1", "k2"] + columns[1:]].values:
+            sizes = [_deep_sizeof((row[0], row[1]), seen)]
+            sizes.extend(_deep_sizeof(x, seen) for x in row[2:])
+            rows.append([row[0], row[1]] + sizes + [sum(sizes)])
+        df = pd.DataFrame(rows, columns=['k1', 'k2'] + columns + ['total'])
+        if by_section:
+            df = df.drop(columns='k2').groupby('k1', as_index=False).sum()
+        return df.sort_values('total', ascending=False
+                              ).reset_index(drop=True)
+
+    def document_options(self, file_format='rst', details=False,
+                         by_section=False, stream=None):
         """Generates a docstring table to add to the library documentation.
 
-        :return: :class:`str`
+        Markdown and HTML tables are generated line by line, so that they
+        can be written to a file without building them in memory. RST
+        tables need the width of their columns first: the rows of each
+        table are kept in memory until it is written.
+
+        :param str file_format: Output format (``rst``, ``markdown`` or
+            ``html``).
+        :param bool details: Add the type, default value and alternative
+            values of each option.
+        :param bool by_section: Make a separate table, under its own
+            heading, for each section.
+        :param stream: File object to write the table to.
+
+        :return: :class:`str` - the table, if no ``stream`` is provided.
+
+        :raises:
+            :ValueError: If an unknown ``file_format`` is requested.
         """
-        k1 = max([len(_) for _ in self.gc['k1']]) + 4
-        k1 = max([k1, len('Option Class')])
-        k2 = max([len(_) for _ in self.gc['k2']]) + 4
-        k2 = max([k2, len('Option ID')])
-
-        separators = "  ".join(["".join(["=", ] * k1),
-                                "".join(["=", ] * k2),
-                                "".join(["=", ] * 11)])
-        line = ("{0:>"+str(k1)+"}  {1:>"+str(k2)+"}  {2}")
-
-        data = []
-        data.append(separators)
-        data.append(line.format('Option Class', 'Option ID', 'Description'))
-        data.append(separators)
-        for _, row in self.gc.iterrows():
-            data.append(line.format("**" + row['k1'] + "**",
-                                    "**" + row['k2'] + "**",
-                                    row['description']))
-        data.append(separators)
-        return "\n".join(data)
+        if file_format.lower() not in _DOCUMENT_FORMATS:
+            raise ValueError('Unknown format {}'.format(file_format))
+        lines = self._document_lines(file_format.lower(), details,
+                                     by_section)
+        if stream is None:
+            return "\n".join(lines)
+        for line in lines:
+            stream.write(line + "\n")
+
+    def _document_lines(self, file_format, details, by_section):
+        """Lines of :meth:`.Config.document_options`."""
+        headers = ['Option Class', 'Option ID', 'Type', 'Default', 'Values',
+                   'Description']
+        names = ['k1', 'k2', 'type', 'default', 'values', 'description']
+        if not details:
+            headers, names = headers[:2] + headers[-1:], names[:2] + names[-1:]
+        if by_section:
+            return self._document_sections(file_format, headers, names)
+        rows = ([_document_cell(n, v) for n, v in zip(names, row)]
+                for row in zip(*[self.gc[n].values for n in names]))
+        return _DOCUMENT_FORMATS[file_format](headers, rows)
+
+    def _document_sections(self, file_format, headers, names):
+        """Lines of :meth:`.Config.document_options` by section.
+
+        Only the rows of each section are grouped beforehand; their cells
+        are made while the section is written.
+        """
+        sections = OrderedDict()
+        for i, key in enumerate(self.gc['k1'].values):
+            sections.setdefault(key, []).append(i)
+        names = names[1:]
+        columns = [self.gc[n].values for n in names]
+        table = _DOCUMENT_FORMATS[file_format]
+        for n, (key, positions) in enumerate(sections.items()):
+            if n > 0:
+                yield ""
+            if file_format == 'rst':
+                yield key
+                yield "-" * len(key)
+                yield ""
+            elif file_format == 'markdown':
+                yield "## {}".format(key)
+                yield ""
+            else:
+                yield "<h2>{}</h2>".format(escape(key))
+            rows = ([_document_cell(name, column[i])
+                     for name, column in zip(names, columns)]
+                    for i in positions)
+            for line in table(headers[1:], rows):
+                yield line
 
     @classmethod
     def get_local_config_file(cls, filename):
@@ -522,6 +1539,514 @@ class Config(object):
                     return config_home
         return None
 
+    def _state(self):
+        """Compact, picklable representation of the configuration.
+
+        :return: :class:`tuple` - (format version, open status, options
+            as tuples following the registry columns).
+        """
+        return (_STATE_VERSION, self.open,
+                [tuple(row) for row in self.gc[self.clmn].values.tolist()])
+
+    def _from_state(self, state):
+        """Replace the configuration with one obtained from :meth:`._state`.
+
+        :raise:
+            :ValueError: If the state comes from an unknown format version.
+        """
+        if state[0] != _STATE_VERSION:
+            raise ValueError("Unknown configuration state version "
+                             "{}".format(state[0]))
+        self.open = state[1]
+        keys = list(zip(self.gc["k1"].values, self.gc["k2"].values))
+        self.gc = pd.DataFrame([list(row) for row in state[2]],
+                               columns=self.clmn)
+        self._reset_index()
+        for i, _type in enumerate(self.gc["type"].values):
+            if ev.is_array_type(_type):
+                # serialization does not keep arrays read-only
+                for column in ("value", "default"):
+                    j = self.clmn.index(column)
+                    self.gc.iat[i, j] = ev.cast(self.gc.iat[i, j], _type)
+        self._changed(keys + [(row[0], row[1]) for row in state[2]])
+
+    def __getstate__(self):
+        """Pickle only the options, as provided by :meth:`._state`."""
+        return self._state()
+
+    def __setstate__(self, state):
+        """Rebuild the configuration from :meth:`._state`."""
+        Config.__init__(self)
+        self._from_state(state)
+
+    def _log_undo(self, action, *args):
+        """Record how to revert a change in the active transaction."""
+        if self._journals:
+            self._journals[-1].append((action, ) + args)
+
+    def _undo(self, journal):
+        """Revert, in reverse order, the changes recorded in a journal."""
+        with self._coalesce():
+            for entry in reversed(journal):
+                self._undo_entry(*entry)
+
+    def _undo_entry(self, action, *args):
+        if action == 'register':
+            pos = self._position(args[0], args[1])
+            self.gc = self.gc.drop(self.gc.index[pos])
+            self._reset_index()
+        elif action == 'unregister':
+            pos, row = args
+            self.gc = pd.concat([self.gc.iloc[:pos], row,
+                                 self.gc.iloc[pos:]], sort=False)
+            self.gc = self.gc.reset_index(drop=True)
+            self._reset_index()
+            args = (row["k1"].values[0], row["k2"].values[0])
+        elif action in ('value', 'locked'):
+            pos = self._position(args[0], args[1])
+            if action == 'value':
+                self._audit_change(args[0], args[1], self._cell(pos, action),
+                                   args[2], 'rollback')
+            self.gc.iat[pos, self.clmn.index(action)] = args[2]
+            if action == 'locked':
+                if args[2]:
+                    self._locked.add((args[0], args[1]))
+                else:
+                    self._locked.discard((args[0], args[1]))
+            self._changed([(args[0], args[1])])
+        elif action == 'column':
+            old = self.gc["value"].values.copy()
+            self.gc["value"] = args[0]
+            self._audit_column(old, 'rollback')
+        elif action == 'frame':
+            self._changed(zip(self.gc["k1"].values, self.gc["k2"].values))
+            self.gc = args[0]
+            self._reset_index()
+        elif action == 'open':
+            self.open = args[0]
+
+        if action in ('register', 'unregister'):
+            self._changed([(args[0], args[1])])
+        elif action in ('column', 'frame'):
+            self._changed(zip(self.gc["k1"].values, self.gc["k2"].values))
+
+    def subscribe(self, key, subkey, callback):
+        """Get notified when options change.
+
+        ``callback`` is called with the :class:`set` of (``key``,
+        ``subkey``) pairs that changed. Changes are reported after
+        :meth:`.Config.set_option`, :meth:`.Config.reset_option`,
+        :meth:`.Config.reset_options`, option (un)registration and when
+        entering or leaving :meth:`.Config.on_option_value`. Bulk changes
+        (loading from files, :meth:`.Config.batch`, rollbacks...) are
+        reported with a single call.
+
+        :param str key: First identifier of the options to follow.
+            :data:`None` to follow all options.
+        :param str subkey: Second identifier of the option to follow.
+            :data:`None` to follow all options under ``key``, including
+            those in its nested sections.
+        :param callback: Function to call on change.
+
+        :return: :class:`int` - identifier to use with
+            :meth:`.Config.unsubscribe`.
+        """
+        key = None if key is None else key.lower()
+        subkey = None if subkey is None else subkey.lower()
+        subscription = next(self._subscription_ids)
+        self._subscribers[subscription] = (key, subkey, callback)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Stop notifying a subscriber.
+
+        :param int subscription: Identifier provided by
+            :meth:`.Config.subscribe`.
+        """
+        self._subscribers.pop(subscription, None)
+
+    @property
+    def generation(self):
+        """Counter increased with every change of the options.
+
+        Changes include values, (un)registration and locks. See
+        :meth:`.Config.get_generation` for the generation of a section or
+        option.
+        """
+        return self.get_generation()
+
+    def get_generation(self, key=None, subkey=None):
+        """Get the generation in which options were last changed.
+
+        Generations only grow: comparing a stored generation with the
+        current one is enough to know if anything changed since then.
+
+        :param str key: First identifier of the option. If not provided,
+            the global generation is returned.
+        :param str subkey: Second identifier of the option. If not
+            provided, the generation of the whole ``key`` section,
+            including its nested sections, is returned.
+
+        :return: :class:`int` - 0 if the options never changed.
+        """
+        if key is None:
+            return self._generation
+        if subkey is None:
+            return self._generations.get(key.lower(), 0)
+        return self._generations.get(_lower_keys(key, subkey), 0)
+
+    def memoize(self, depends, maxsize=128):
+        """Cache the results of a function that depends on some options.
+
+        Cached results are dropped when any of the options the function
+        depends on changes, including inside
+        :meth:`.Config.on_option_value`. As in :func:`functools.lru_cache`,
+        the decorated function provides ``cache_info()`` and
+        ``cache_clear()``.
+
+        :param depends: Options used by the function.
+        :type depends: :func:`list` of (``key``, ``subkey``)
+        :param int maxsize: Maximum number of cached results; the least
+            recently used are dropped first. :data:`None` for no limit.
+
+        .. ipython::
+
+            In [1]: from libconfig import Config
+               ...: c = Config()
+               ...: c.register_option('opt', 'on', 1, 'int', 'option 1')
+               ...: @c.memoize(depends=[('opt', 'on')])
+               ...: def scale(x):
+               ...:     return x * c.get_option('opt', 'on')
+               ...: print(scale(2), scale(2))
+               ...: with c.on_option_value('opt', 'on', 10):
+               ...:     print(scale(2))
+               ...: print(scale.cache_info())
+        """
+        depends = [_lower_keys(k, sk) for k, sk in depends]
+
+        def decorator(function):
+            cache = OrderedDict()
+            lock = threading.RLock()
+            stats = {'hits': 0, 'misses': 0, 'stamp': None}
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                key = args
+                if kwargs:
+                    key += (_KWARGS_MARK, ) + tuple(sorted(kwargs.items()))
+                stamp = tuple(self.get_generation(k, sk) for k, sk in depends)
+                with lock:
+                    if stamp != stats['stamp']:
+                        cache.clear()
+                        stats['stamp'] = stamp
+                    if key in cache:
+                        stats['hits'] += 1
+                        self._cache_totals[0] += 1
+                        result = cache.pop(key)
+                        cache[key] = result
+                        return result
+                    stats['misses'] += 1
+                    self._cache_totals[1] += 1
+                result = function(*args, **kwargs)
+                with lock:
+                    if stamp == stats['stamp']:
+                        cache[key] = result
+                        if maxsize is not None and len(cache) > maxsize:
+                            cache.popitem(last=False)
+                return result
+
+            def cache_info():
+                return CacheInfo(stats['hits'], stats['misses'], maxsize,
+                                 len(cache))
+
+            def cache_clear():
+                with lock:
+                    cache.clear()
+                    stats.update(hits=0, misses=0)
+
+            wrapper.cache_info = cache_info
+            wrapper.cache_clear = cache_clear
+            return wrapper
+        return decorator
+
+    def instrument(self, enabled=True):
+        """Count the calls to :meth:`.Config.get_option`,
+        :meth:`.Config.set_option` and :meth:`.Config.check_option` and the
+        time spent in them, per option.
+
+        Instrumentation replaces these methods on this instance only, so
+        it has no cost when it is not enabled. Counters are kept when it is
+        disabled; see :meth:`.Config.access_stats`.
+
+        :param bool enabled: Start (:data:`True`) or stop (:data:`False`)
+            counting.
+        """
+        if enabled and self._stats is None:
+            self._stats = {}
+        self._instrumenting = enabled
+        self._wrap_accessors()
+
+    def _wrap_accessors(self):
+        """Replace the option accessors of this instance according to the
+        active instrumentation and tracing."""
+        for name in _INSTRUMENTED:
+            self.__dict__.pop(name, None)
+        if self._instrumenting:
+            for name, column in _INSTRUMENTED.items():
+                setattr(self, name,
+                        self._instrumented(getattr(self, name), column))
+        if self._tracing:
+            self.get_option = self._traced(self.get_option)
+
+    def _instrumented(self, method, column):
+        """Wrap a method to record its calls in the access statistics."""
+        stats, totals = self._stats, self._stats_totals
+
+        @functools.wraps(method)
+        def wrapper(key, subkey, *args, **kwargs):
+            option = _lower_keys(key, subkey)
+            start = default_timer()
+            try:
+                return method(key, subkey, *args, **kwargs)
+            finally:
+                elapsed = default_timer() - start
+                entry = stats.get(option)
+                if entry is None:
+                    entry = stats[option] = [0, 0.0, 0, 0.0, 0, 0.0]
+                entry[column] += 1
+                entry[column + 1] += elapsed
+                totals[column] += 1
+                totals[column + 1] += elapsed
+        return wrapper
+
+    def trace(self, enabled=True, at_exit=False):
+        """Record which options are read and which loaded values do not
+        match any option.
+
+        Starting a trace discards the previous one. Results are kept when
+        it is stopped; see :meth:`.Config.unused_options`,
+        :meth:`.Config.unmatched_entries` and :meth:`.Config.trace_report`.
+        As with :meth:`.Config.instrument`, reads are recorded by replacing
+        :meth:`.Config.get_option` on this instance only.
+
+        :param bool enabled: Start (:data:`True`) or stop (:data:`False`)
+            tracing.
+        :param bool at_exit: Write :meth:`.Config.trace_report` to the
+            standard error when the interpreter exits. The report is
+            written once, however many traces ask for it.
+        """
+        if enabled and not self._tracing:
+            self._accessed, self._unmatched = set(), OrderedDict()
+        self._tracing = enabled
+        self._wrap_accessors()
+        if enabled and at_exit and not self._trace_at_exit:
+            self._trace_at_exit = True
+            atexit.register(lambda: sys.stderr.write(self.trace_report()))
+
+    def _traced(self, method):
+        """Wrap :meth:`.Config.get_option` to record the options read."""
+        accessed = self._accessed
+
+        @functools.wraps(method)
+        def wrapper(key, subkey, *args, **kwargs):
+            value = method(key, subkey, *args, **kwargs)
+            accessed.add(_lower_keys(key, subkey))
+            return value
+        return wrapper
+
+    def unused_options(self):
+        """Options not read since :meth:`.Config.trace` started.
+
+        :return: :func:`list` of (``key``, ``subkey``), in registration
+            order.
+        """
+        accessed = self._accessed or set()
+        return [k for k in zip(self.gc["k1"].values, self.gc["k2"].values)
+                if k not in accessed]
+
+    def unmatched_entries(self):
+        """Loaded values that did not match any option since
+        :meth:`.Config.trace` started.
+
+        :return: :class:`~collections.OrderedDict` of (``key``, ``subkey``)
+            to the :func:`list` of files that provided them (:data:`None`
+            for dictionaries).
+        """
+        return OrderedDict((k, list(v))
+                           for k, v in (self._unmatched or {}).items())
+
+    def trace_report(self):
+        """Summary of :meth:`.Config.unused_options` and
+        :meth:`.Config.unmatched_entries`.
+
+        :return: :class:`str`
+        """
+        lines = ["Unused options:"]
+        lines.extend("  {0}.{1}".format(*k) for k in self.unused_options())
+        lines.append("Unmatched entries:")
+        lines.extend("  {0}.{1} ({2})".format(k[0], k[1], ", ".join(
+            str(source) for source in sources))
+            for k, sources in self.unmatched_entries().items())
+        return "\n".join(lines) + "\n"
+
+    def audit(self, enabled=True, size=1000):
+        """Keep a log of the latest changes to option values.
+
+        Each change to an option value is recorded as an
+        :class:`.AuditRecord` with the option, its previous and new values,
+        what changed it (``set_option``, ``batch``, ``merge``,
+        ``on_option_value``, ``reset``, ``restore``, ``rollback``,
+        ``values`` for :meth:`.Config.set_options_from_values` or the
+        loaded file, ``dict`` for dictionaries) and the time, from a
+        monotonic clock. Only the last ``size`` changes are kept.
+
+        :param bool enabled: Start (:data:`True`) or stop (:data:`False`)
+            recording. Records are kept when stopped.
+        :param int size: Maximum number of records.
+        """
+        if enabled:
+            self._audit_records = deque(self._audit_records or (),
+                                        maxlen=size)
+        self._audit = self._audit_records if enabled else None
+
+    def _audit_change(self, key, subkey, old, new, source):
+        """Record a change in the audit log, if enabled."""
+        if self._audit is not None:
+            self._audit.append(AuditRecord(_monotonic(), key, subkey, old,
+                                           new, source))
+
+    def _audit_column(self, old, source):
+        """Record the changes from a replaced value column."""
+        if self._audit is None:
+            return
+        new = self.gc["value"].values
+        for i, key, subkey, _type in zip(itertools.count(),
+                                         self.gc["k1"].values,
+                                         self.gc["k2"].values,
+                                         self.gc["type"].values):
+            if old[i] is not new[i] and \
+               not ev.is_equal(old[i], new[i], _type):
+                self._audit_change(key, subkey, old[i], new[i], source)
+
+    def audit_log(self):
+        """Changes recorded by :meth:`.Config.audit`, oldest first.
+
+        :return: :func:`list` of :class:`.AuditRecord`
+        """
+        return list(self._audit_records or ())
+
+    def write_audit_log(self, filename):
+        """Write the changes recorded by :meth:`.Config.audit` as JSON
+        Lines.
+
+        Besides the monotonic ``timestamp``, each record includes the
+        estimated wall-clock ``time`` of the change.
+
+        :param str filename: Target file.
+        """
+        offset = time.time() - _monotonic()
+        with open(filename, "w") as fd:
+            for record in self.audit_log():
+                entry = record._asdict()
+                entry["time"] = record.timestamp + offset
+                fd.write(json.dumps(entry, default=_json_default) + "\n")
+
+    def access_stats(self, reset=False):
+        """Access statistics collected since :meth:`.Config.instrument`.
+
+        :param bool reset: Clear the counters after reading them.
+
+        :return: :class:`~pandas.DataFrame` - calls and seconds spent per
+            option, sorted by number of reads.
+        """
+        columns = ['k1', 'k2', 'get_calls', 'get_time', 'set_calls',
+                   'set_time', 'check_calls', 'check_time']
+        stats = self._stats or {}
+        df = pd.DataFrame([list(k) + v for k, v in stats.items()],
+                          columns=columns)
+        if reset:
+            stats.clear()
+        return df.sort_values(['get_calls', 'k1', 'k2'],
+                              ascending=[False, True, True]
+                              ).reset_index(drop=True)
+
+    def access_report(self, top=10):
+        """Summary of the most read options, as collected by
+        :meth:`.Config.instrument`.
+
+        :param int top: Number of options to show. :data:`None` for all.
+
+        :return: :class:`str`
+        """
+        df = self.access_stats()
+        if top is not None:
+            df = df.head(top)
+        return df.to_string(index=False)
+
+    def _changed(self, keys):
+        """Update generations and report changed options to subscribers."""
+        self._generation += 1
+        keys = set(keys)
+        for key in keys:
+            self._generations[key] = self._generation
+            # the section and all the sections it is nested in
+            sections = key[0].split(".")
+            for i in range(len(sections)):
+                self._generations[".".join(sections[:i + 1])] = \
+                    self._generation
+        if self._snapshot is not None:
+            self._snapshot_dirty.update(keys)
+        if self._pending is not None:
+            self._pending.update(keys)
+            return
+        if not self._subscribers:
+            return
+        for key, subkey, callback in list(self._subscribers.values()):
+            selected = set(k for k in keys
+                           if (key is None or k[0] == key or
+                               (subkey is None and
+                                k[0].startswith(key + "."))) and
+                           (subkey is None or k[1] == subkey))
+            if selected:
+                callback(selected)
+
+    @contextmanager
+    def _coalesce(self):
+        """Report all changes done inside the ``with`` statement at once."""
+        if self._pending is not None:
+            yield
+            return
+        self._pending = set()
+        try:
+            yield
+        finally:
+            pending, self._pending = self._pending, None
+            if pending:
+                self._changed(pending)
+
+    def transaction(self):
+        """Group changes to the configuration so that they can be reverted.
+
+        Only the options affected inside the transaction are recorded, so
+        that reverting them does not require a copy of the whole
+        configuration. If the ``with`` statement finishes with an error,
+        all changes are reverted; otherwise they are kept. The transaction
+        can also be closed explicitly with ``commit`` or ``rollback``.
+        Transactions can be nested.
+
+        .. ipython::
+
+            In [1]: from libconfig import Config
+               ...: c = Config()
+               ...: c.register_option('opt', 'on', 1, 'int', 'option 1')
+               ...: with c.transaction() as t:
+               ...:     c.set_option('opt', 'on', 10)
+               ...:     print('in transaction', c.get_option('opt', 'on'))
+               ...:     t.rollback()
+               ...: print('after rollback', c.get_option('opt', 'on'))
+        """
+        return TRANSACTION(self)
+
     def ifndef(self):
         """Equivalent to C's #IFNDEF.
 
@@ -537,6 +2062,11 @@ class Config(object):
     def on_option_value(self, *args):
         """Temporarily change the configuration values.
 
+        Options can be provided as consecutive ``key``, ``subkey``, ``value``
+        triplets or as a single :class:`dict` of (``key``, ``subkey``) to
+        ``value``. New values are validated together on entry; on exit,
+        previous values are restored directly.
+
         :raises:
             :ValueError: If the number of parameters cannot be casted into
                 one or multiple options.
@@ -557,55 +2087,340 @@ class Config(object):
                ...:     print('with opt.two', c.get_option('opt', 'tw'))
                ...: print('opt.one', c.get_option('opt', 'on'))
                ...: print('opt.two', c.get_option('opt', 'tw'))
+               ...: with c.on_option_value({('opt', 'on'): 10}):
+               ...:     print('with opt.one', c.get_option('opt', 'on'))
                ...: c.unregister_option('opt', 'on')
                ...: c.unregister_option('opt', 'tw')
         """
         return ONVALUE(self, *args)
 
+    def batch(self):
+        """Stage multiple option changes and apply them together.
+
+        Values staged with ``set`` are validated in a single pass over the
+        registry when the ``with`` statement finishes (or when ``commit``
+        is called). If any of them is not valid, none is applied. If the
+        ``with`` block raises an error, staged values are discarded.
+
+        .. ipython::
+
+            In [1]: from libconfig import Config
+               ...: c = Config()
+               ...: c.register_option('opt', 'on', 1, 'int', 'option 1')
+               ...: c.register_option('opt', 'tw', 2, 'int', 'option 2')
+               ...: with c.batch() as b:
+               ...:     b.set('opt', 'on', 10)
+               ...:     b.set('opt', 'tw', 20)
+               ...: print('opt.one', c.get_option('opt', 'on'))
+               ...: print('opt.two', c.get_option('opt', 'tw'))
+        """
+        return BATCH(self)
+
 
 class ONVALUE(object):
     def __init__(self, *args):
-        def chunks(l, n):
-            for i in range(0, len(l), n):
-                yield l[i:i + n]
-
         self.cfg = args[0]
         args = args[1:]
 
+        if len(args) == 1 and isinstance(args[0], dict):
+            args = [x for k, v in args[0].items() for x in (k[0], k[1], v)]
         if not (len(args) % 3 == 0 and len(args) >= 3):
             raise ValueError('option values are defined in 3s.')
 
-        self.values = pd.DataFrame(chunks(args, 3),
-                                   columns=['k1', 'k2', 'new_value'])
-        self.values['old_value'] = \
-            [self.cfg.get_option(l['k1'], l['k2'], in_path_none=True)
-             for _, l in self.values.iterrows()]
+        self.values = OrderedDict((_lower_keys(args[i], args[i + 1]),
+                                   args[i + 2])
+                                  for i in range(0, len(args), 3))
+        self.old_values = None
 
     def __enter__(self):
         """On enter, each requested option is changed by the new value."""
-        for _, l in self.values.iterrows():
-            self.cfg.set_option(l['k1'], l['k2'], l['new_value'])
+        self.old_values = self.cfg._get_values(list(self.values))
+        self.cfg._set_options(self.values, source='on_option_value')
 
     def __exit__(self, *args):
         """On exit, the original values of the options are retrieved back."""
-        for _, l in self.values.iterrows():
-            self.cfg.set_option(l['k1'], l['k2'], l['old_value'])
+        self.cfg._set_options(self.old_values, validate=False,
+                              source='on_option_value')
 
 
-class IFNDEF(object):
+class TRANSACTION(object):
     def __init__(self, config):
         self.cfg = config
-        self.backup = config.gc.copy()
+        self.journal = None
+
+    def begin(self):
+        """Start recording changes."""
+        if self.journal is not None:
+            raise RuntimeError("transaction already started")
+        self.journal = []
+        self.cfg._journals.append(self.journal)
+
+    def _close(self):
+        if self.journal is None:
+            raise RuntimeError("transaction not started")
+        if self.cfg._journals[-1] is not self.journal:
+            raise RuntimeError("nested transactions have to be "
+                               "closed first")
+        self.cfg._journals.pop()
+        journal, self.journal = self.journal, None
+        return journal
+
+    def commit(self):
+        """Keep the changes.
+
+        Inside an outer transaction, changes can still be reverted by it.
+        """
+        journal = self._close()
+        if self.cfg._journals:
+            self.cfg._journals[-1].extend(journal)
+
+    def rollback(self):
+        """Revert all changes done since the transaction started."""
+        self.cfg._undo(self._close())
 
     def __enter__(self):
-        """Nothing is setup on entry."""
-        pass
+        """Start recording changes."""
+        self.begin()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Revert changes on error, keep them otherwise."""
+        if self.journal is None:
+            return
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
 
+class IFNDEF(TRANSACTION):
     def __exit__(self, exc_type, exc_value, traceback):
         """If the execution fails, keep previous configutation."""
         if isinstance(exc_value, AlreadyRegisteredError):
-            self.cfg.gc = self.backup.copy()
+            self.rollback()
             return True
+        self.commit()
+
+
+class BATCH(object):
+    def __init__(self, config):
+        self.cfg = config
+        self.staged = OrderedDict()
+
+    def set(self, key, subkey, value):
+        """Stage a new value for an option."""
+        self.staged[_lower_keys(key, subkey)] = value
+
+    def commit(self):
+        """Validate and apply all staged values."""
+        staged, self.staged = self.staged, OrderedDict()
+        self.cfg._set_options(staged, source='batch')
+
+    def discard(self):
+        """Drop all staged values."""
+        self.staged = OrderedDict()
+
+    def __enter__(self):
+        """Provide the batch to stage values on."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Commit the staged values unless the block failed."""
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+
+class LoadProfile(object):
+    """Time spent by a load, as collected by :meth:`.Config.profile_loads`.
+
+    :ivar str source: Loaded file, :data:`None` for dictionaries.
+    :ivar float total: Seconds spent in the whole load.
+    :ivar stages: Seconds spent in each stage (``read``, ``parse``,
+        ``cast``, ``validate`` and ``apply``).
+    :vartype stages: :class:`~collections.OrderedDict`
+    :ivar types: Seconds spent in each stage for each option type.
+    :vartype types: :class:`dict`
+    :ivar int options: Number of loaded values that match an option.
+    """
+    STAGES = ('read', 'parse', 'cast', 'validate', 'apply')
+
+    def __init__(self, source=None):
+        self.source = source
+        self.total = 0.0
+        self.stages = OrderedDict((stage, 0.0) for stage in self.STAGES)
+        self.types = {}
+        self.options = 0
+
+    def add(self, stage, elapsed, _type=None):
+        """Account time to a stage and, optionally, to an option type."""
+        self.stages[stage] += elapsed
+        if _type is not None:
+            stages = self.types.setdefault(_type, OrderedDict())
+            stages[stage] = stages.get(stage, 0.0) + elapsed
+
+    def to_dict(self):
+        """Plain :class:`dict` with the profile, to forward it elsewhere."""
+        return {'source': self.source, 'total': self.total,
+                'options': self.options, 'stages': dict(self.stages),
+                'types': dict((k, dict(v)) for k, v in self.types.items())}
+
+    def __repr__(self):
+        return "LoadProfile(source={0!r}, total={1:.6f}, options={2})".format(
+            self.source, self.total, self.options)
+
+
+class Snapshot(object):
+    """Immutable option values recorded by :meth:`.Config.snapshot`.
+
+    :ivar int generation: Generation of the configuration when the
+        snapshot was taken.
+    """
+    __slots__ = ('_parent', '_entries', '_keys', '_depth', 'generation')
+
+    def __init__(self, parent, entries, keys, generation):
+        object.__setattr__(self, '_parent', parent)
+        object.__setattr__(self, '_entries', entries)
+        object.__setattr__(self, '_keys', keys)
+        object.__setattr__(self, '_depth',
+                           0 if parent is None else parent._depth + 1)
+        object.__setattr__(self, 'generation', generation)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Snapshots cannot be modified")
+
+    def _entry(self, key):
+        """(value, locked) of an option, looked up through the parents."""
+        snap = self
+        while key not in snap._entries:
+            snap = snap._parent
+        return snap._entries[key]
+
+    def get(self, key, subkey):
+        """Value of an option in the snapshot.
+
+        :param str key: First identifier of the option.
+        :param str subkey: Second identifier of the option.
+
+        :raise:
+            :NotRegisteredError: If the option was not registered.
+        """
+        key = _lower_keys(key, subkey)
+        _entry_must_exist(self._keys, *key)
+        return self._entry(key)[0]
+
+    def keys(self):
+        """:class:`frozenset` of (``key``, ``subkey``) in the snapshot."""
+        return self._keys
+
+    def to_dict(self):
+        """:class:`dict` of (``key``, ``subkey``) to value."""
+        return dict((k, self._entry(k)[0]) for k in self._keys)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+
+# file format: suffix of its loading and writing methods
+_FILE_FORMATS = {'yaml': 'YAML', 'json': 'JSON', 'toml': 'TOML', 'ini': 'INI',
+                 'env': 'ENV'}
+_EXTENSIONS = {'.yaml': 'yaml', '.yml': 'yaml', '.json': 'json',
+               '.toml': 'toml', '.ini': 'ini', '.env': 'env'}
+
+
+def _file_format(filename):
+    """Guess the format of a file from its extension."""
+    name = os.path.basename(filename).lower()
+    if name == '.env' or name.startswith('.env.'):
+        return 'env'
+    return _EXTENSIONS.get(os.path.splitext(name)[1], 'yaml')
+
+
+def _parse_ini(text):
+    """Read the sections of an INI file as a :class:`dict` of text."""
+    parser = configparser.RawConfigParser()
+    if six.PY2:
+        parser.readfp(six.StringIO(text))
+    else:
+        parser.read_string(text)
+    return dict((section.lower(), dict((k, _unquote(v))
+                                       for k, v in parser.items(section)))
+                for section in parser.sections())
+
+
+def _parse_env(text):
+    """Read the variables of a dotenv file as a :class:`dict` of text."""
+    data = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("export "):
+            line = line[len("export "):]
+        name, _, value = line.partition("=")
+        keys = name.strip().lower().split("__")
+        if len(keys) < 2:
+            continue
+        value = _unquote(value.strip())
+        data.setdefault(".".join(keys[:-1]), {})[keys[-1]] = value
+    return data
+
+
+def _unquote(value):
+    """Text of a value of INI and dotenv files, which may be quoted."""
+    if len(value) > 1 and value[0] == value[-1] == '"':
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value[1:-1]
+    if len(value) > 1 and value[0] == value[-1] == "'":
+        return value[1:-1]
+    return value
+
+
+def _toml_key(key):
+    if re.match(r'^[A-Za-z0-9_-]+$', key):
+        return key
+    return json.dumps(key)
+
+
+def _toml_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float):
+        if value != value:
+            return "nan"
+        if value in (float("inf"), float("-inf")):
+            return "inf" if value > 0 else "-inf"
+        return repr(value)
+    if isinstance(value, six.integer_types):
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(_toml_value(x) for x in value) + "]"
+    return json.dumps(str(value))
+
+
+def _toml_lines(table, path):
+    """Lines of a TOML table and its subtables, for dotted ``path``."""
+    subtables = []
+    for key, value in table.items():
+        if isinstance(value, dict):
+            subtables.append((key, value))
+        elif value is not None:
+            yield "{0} = {1}".format(_toml_key(key), _toml_value(value))
+    for n, (key, value) in enumerate(subtables):
+        if path or n > 0:
+            yield ""
+        name = path + [_toml_key(key)]
+        yield "[{}]".format(".".join(name))
+        for line in _toml_lines(value, name):
+            yield line
 
 
 def _options_to_dict(df):
@@ -614,8 +2429,11 @@ def _options_to_dict(df):
     d = df[kolums].values.tolist()
     dc = {}
     for x in d:
-        dc.setdefault(x[0], {})
-        dc[x[0]][x[1]] = x[2]
+        section = dc
+        for k in x[0].split("."):
+            section = section.setdefault(k, {})
+        section[x[1]] = x[2].tolist() if isinstance(x[2], np.ndarray) \
+            else x[2]
     return dc
 
 
@@ -632,37 +2450,265 @@ def _get_repo():
                 .stdout.decode('utf-8').strip())    # nosec
 
 
+def _document_cell(column, value):
+    """Text of a cell of :meth:`.Config.document_options`."""
+    if column == 'values':
+        if value is None:
+            return ""
+        return ", ".join(str(_json_default(x)) for x in value)
+    if isinstance(value, (np.ndarray, np.generic)):
+        return str(_json_default(value))
+    return str(value)
+
+
+def _document_bold(headers, rows, bold):
+    """Highlight the option identifiers of the rows."""
+    keys = [h in ('Option Class', 'Option ID') for h in headers]
+    for row in rows:
+        yield [bold.format(c) if k else c for k, c in zip(keys, row)]
+
+
+def _document_rst(headers, rows):
+    """RST simple table of :meth:`.Config.document_options`."""
+    rows = list(_document_bold(headers, rows, "**{}**"))
+    widths = [max([len(row[i]) for row in rows] + [len(header)])
+              for i, header in enumerate(headers[:-1])]
+    widths.append(len(headers[-1]))
+    separators = "  ".join("=" * w for w in widths)
+    line = "  ".join(["{" + str(i) + ":>" + str(w) + "}"
+                      for i, w in enumerate(widths[:-1])] +
+                     ["{" + str(len(widths) - 1) + "}"])
+    yield separators
+    yield line.format(*headers)
+    yield separators
+    for row in rows:
+        yield line.format(*row)
+    yield separators
+
+
+def _document_markdown(headers, rows):
+    """Markdown table of :meth:`.Config.document_options`."""
+    yield "| " + " | ".join(headers) + " |"
+    yield "|" + "|".join(" --- " for _ in headers) + "|"
+    for row in _document_bold(headers, rows, "**{}**"):
+        yield "| " + " | ".join(c.replace("|", "\\|") for c in row) + " |"
+
+
+def _document_html(headers, rows):
+    """HTML table of :meth:`.Config.document_options`."""
+    yield "<table>"
+    yield "<thead>"
+    yield "<tr>" + "".join("<th>{}</th>".format(h) for h in headers) + "</tr>"
+    yield "</thead>"
+    yield "<tbody>"
+    rows = ([escape(c) for c in row] for row in rows)
+    for row in _document_bold(headers, rows, "<strong>{}</strong>"):
+        yield "<tr>" + "".join("<td>{}</td>".format(c) for c in row) + "</tr>"
+    yield "</tbody>"
+    yield "</table>"
+
+
+_DOCUMENT_FORMATS = {'rst': _document_rst, 'markdown': _document_markdown,
+                     'html': _document_html}
+
+
+def _frozen_frame(frame):
+    """Copy of a :class:`~pandas.DataFrame` with read-only cells.
+
+    All the columns are kept as objects in a single read-only array, which
+    is shared by the shallow copies of the returned frame.
+    """
+    values = np.array(frame.values, dtype=object)
+    values.flags.writeable = False
+    return pd.DataFrame(values, index=frame.index, columns=frame.columns,
+                        dtype=object, copy=False)
+
+
+def _json_default(obj):
+    """Make values that JSON cannot serialize directly printable."""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return str(obj)
+
+
+def _json_value(value):
+    """Make a value of an option serializable as JSON."""
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    return value
+
+
+# JSON Schema type of each option type (of the elements, for arrays)
+_SCHEMA_TYPES = {'int': 'integer', 'float': 'number', 'bool': 'boolean',
+                 'text': 'string', 'string': 'string',
+                 'path_in': ['string', 'null'], 'path_out': 'string',
+                 'int_array': 'integer', 'float_array': 'number',
+                 'bool_array': 'boolean'}
+
+
+def _schema_section(allow_unknown):
+    """JSON Schema of a section, without its options."""
+    return {"type": "object", "properties": {},
+            "additionalProperties": allow_unknown}
+
+
+def _schema_type(_type, values, shape, definitions, name):
+    """JSON Schema of the values accepted by an option.
+
+    :param dict definitions: Schemas shared through ``$ref``; the elements
+        of arrays without ``shape`` are added as ``name``.
+    """
+    schema = {"type": _SCHEMA_TYPES[_type.lower()]}
+    if values is not None:
+        schema["enum"] = [_json_value(x) for x in values]
+    if not ev.is_array_type(_type):
+        return schema
+    if shape is None:
+        # any number of dimensions: elements or arrays of them
+        ref = {"$ref": "#/definitions/" + name.replace(
+            "~", "~0").replace("/", "~1")}
+        definitions[name] = {"anyOf": [schema, {"type": "array",
+                                                "items": ref}]}
+        return {"type": "array", "items": ref}
+    for length in reversed(shape):
+        schema = {"type": "array", "items": schema}
+        if length not in (None, -1):
+            schema["minItems"] = schema["maxItems"] = length
+    return schema
+
+
+def _compile_check(_type, values, shape):
+    """Make the check of the values loaded for an option.
+
+    :return: :func:`callable` - takes the value, the current value of the
+        option, if it is locked and the directory of relative paths, and
+        returns an error message or :data:`None`.
+    """
+    array = ev.is_array_type(_type)
+    accepted = None if values is None else \
+        "accepted options are: [{}]".format(", ".join(str(x) for x in values))
+
+    def check(value, current, locked, directory):
+        if isinstance(value, six.string_types):
+            value = str(value)
+        try:
+            if not array:
+                value = ev.cast(value, _type)
+            if ev.is_equal(current, value, _type):
+                return None
+            if locked:
+                return "option is locked"
+            try:
+                ev.value_eval(value, _type)
+            except IOError:
+                if directory is None:
+                    raise
+                ev.value_eval(os.path.normpath(os.path.join(directory,
+                                                            value)), _type)
+            ev.shape_eval(value, shape)
+        except (IOError, TypeError, ValueError) as e:
+            return str(e)
+        if not ev.value_in(value, values, _type):
+            return accepted
+        return None
+    return check
+
+
+def _deep_sizeof(obj, seen):
+    """Size in bytes of an object and the objects it contains.
+
+    Objects whose :func:`id` is in ``seen`` are not counted again.
+    """
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, np.ndarray):
+        if obj.base is not None:
+            # views do not include the data they point to
+            size += obj.nbytes
+    elif isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen)
+                    for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(x, seen) for x in obj)
+    return size
+
+
 def _lower_keys(key, subkey):
     """Make sure keys are always lower key."""
     return key.lower(), subkey.lower()
 
 
-def _entry_must_exist(df, k1, k2):
+def _entry_must_exist(index, k1, k2):
     """Evaluate key-subkey existence.
 
     Checks that the key-subkey combo exists in the
     configuration options.
     """
-    count = df[(df['k1'] == k1) &
-               (df['k2'] == k2)].shape[0]
-    if count == 0:
+    if (k1, k2) not in index:
         raise NotRegisteredError(
             "Option {0}.{1} not registered".format(k1, k2))
 
 
-def _entry_must_not_exist(df, k1, k2):
+def _entry_must_not_exist(index, k1, k2):
     """Evaluate key-subkey non-existence.
 
     Checks that the key-subkey combo does not exists in the
     configuration options.
     """
-    count = df[(df['k1'] == k1) &
-               (df['k2'] == k2)].shape[0]
-    if count > 0:
+    if (k1, k2) in index:
         raise AlreadyRegisteredError(
             "Option {0}.{1} already registered".format(k1, k2))
 
 
+def _tree_check(tree, k1, k2):
+    """Check that an option fits in the tree of sections.
+
+    Sections are nested dictionaries; options are their leaves. An
+    option cannot be named as a section at the same level, nor be
+    placed under another option.
+    """
+    if "." in k2 or "" in k1.split("."):
+        raise ValueError("Invalid option name {0}.{1}".format(k1, k2))
+    node = tree
+    for k in k1.split("."):
+        node = node.get(k, {})
+        if not isinstance(node, dict):
+            raise ValueError("Section {0} clashes with option {1}.{2}".format(
+                k1, *node))
+    if k2 in node:
+        raise ValueError("Option {0}.{1} clashes with a section".format(
+            k1, k2))
+
+
+def _tree_insert(tree, k1, k2):
+    """Add an option to the tree of sections."""
+    node = tree
+    for k in k1.split("."):
+        node = node.setdefault(k, {})
+    node[k2] = (k1, k2)
+
+
+def _tree_leaves(tree, k1):
+    """All options under a section of the tree of sections."""
+    node = tree
+    for k in k1.split("."):
+        if not isinstance(node, dict) or k not in node:
+            return []
+        node = node[k]
+    leaves, pending = [], [node]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, dict):
+            pending.extend(node.values())
+        else:
+            leaves.append(node)
+    return leaves
+
+
 class AlreadyRegisteredError(Exception):
     """
     """
@@ -10,7 +10,10 @@
 # @Last modified time: 05-Feb-2019
 #
 # -*-
+import json
 import os
+
+import numpy as np
 try:
     # up until pandas 0.24.2
     from pandas.core.config import (is_int, is_float, is_bool, is_text)
@@ -18,7 +21,11 @@ except ImportError:
     # from pandas 0.25.0
     from pandas._config.config import (is_int, is_float, is_bool, is_text)
 
-__all__ = ["value_eval", "cast"]
+__all__ = ["value_eval", "shape_eval", "cast", "is_array_type",
+           "value_in", "is_equal", "from_text", "to_text"]
+
+_TRUE = ("true", "yes", "on", "1")
+_FALSE = ("false", "no", "off", "0")
 
 
 def is_path(value):
@@ -28,11 +35,48 @@ def is_path(value):
             raise IOError(msg.format(type_repr="path"))
 
 
+def _array_factory(kinds, dtype):
+    """Vectorized check that a value can be held by an array of ``dtype``.
+
+    Validation only looks at the dtype numpy infers for the whole value
+    (and at the maximum of unsigned values, which may not fit in a signed
+    ``dtype``), so the cost does not depend on Python-level iteration over
+    elements.
+    """
+    # compared as unsigned: mixed comparisons may go through float64
+    limit = np.uint64(np.iinfo(dtype).max) \
+        if np.dtype(dtype).kind == "i" else None
+
+    def is_array(value):
+        arr = np.asarray(value)
+        if arr.size > 0 and arr.dtype.kind not in kinds:
+            msg = "Value must be an array of {type_repr}"
+            raise ValueError(msg.format(type_repr=np.dtype(dtype).name))
+        if arr.size > 0 and arr.dtype.kind == "u" and limit is not None \
+           and arr.max() > limit:
+            msg = "Values must fit in {type_repr}"
+            raise ValueError(msg.format(type_repr=np.dtype(dtype).name))
+    return is_array
+
+
+# array type: (accepted numpy dtype kinds, storage dtype)
+_ARRAYS = {
+    "int_array": ("iu", np.int64),
+    "float_array": ("iuf", np.float64),
+    "bool_array": ("b", np.bool_)
+}
+
 _TYPES = {
     "int": is_int,      "float": is_float, "bool": is_bool,
     "text": is_text,    "string": is_text,
     "path_in": is_path, "path_out": is_text
 }
+_TYPES.update({k: _array_factory(*v) for k, v in _ARRAYS.items()})
+
+
+def is_array_type(_type):
+    """Check if a value type is stored as a :class:`~numpy.ndarray`."""
+    return _type.lower() in _ARRAYS
 
 
 def value_eval(value, _type):
@@ -45,9 +89,106 @@ def value_eval(value, _type):
     return _TYPES[_type](value)
 
 
+def shape_eval(value, shape):
+    """Check the shape of an array value.
+
+    :param value: Value to evaluate.
+    :param tuple shape: Expected shape. :data:`None` or ``-1`` in any
+        dimension accept any length for that dimension.
+
+    :raise:
+        :ValueError: If the shape of ``value`` does not match.
+    """
+    if shape is None:
+        return
+    vshape = np.shape(value)
+    if len(vshape) != len(shape) or \
+       any(s not in (None, -1) and s != v for s, v in zip(shape, vshape)):
+        msg = "Value must be an array of shape {0}; found {1}"
+        raise ValueError(msg.format(tuple(shape), vshape))
+
+
 def cast(value, _type):
     if _type == "bool":
         return bool(value)
     if _type == "int":
         return int(value)
+    if is_array_type(_type):
+        dtype = _ARRAYS[_type.lower()][1]
+        if isinstance(value, np.ndarray) and value.dtype == dtype and \
+           not value.flags.writeable:
+            # Already a frozen array: no need to copy it again.
+            return value
+        value = np.array(value, dtype=dtype)
+        value.flags.writeable = False
     return value
+
+
+def value_in(value, values, _type):
+    """Check if ``value`` is amongst the accepted ``values``.
+
+    For array types, each element of ``value`` has to be accepted.
+    """
+    if values is None:
+        return True
+    if is_array_type(_type):
+        return bool(np.isin(value, values).all())
+    return value in values
+
+
+def is_equal(a, b, _type):
+    """Compare two values of the same option type."""
+    if is_array_type(_type):
+        return np.shape(a) == np.shape(b) and bool(np.all(np.equal(a, b)))
+    return a == b
+
+
+def _text_item(text):
+    """Value of JSON text (a list or one of its elements), or the text
+    itself if it is not valid JSON."""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def from_text(text, _type):
+    """Read a value of an option type from text (INI or .env files).
+
+    Text that cannot be read as ``_type`` is returned as it is, so that
+    validation reports it.
+    """
+    _type = _type.lower()
+    try:
+        if _type == "int":
+            return int(text)
+        if _type == "float":
+            return float(text)
+    except ValueError:
+        return text
+    if _type == "bool":
+        if text.lower() in _TRUE:
+            return True
+        if text.lower() in _FALSE:
+            return False
+        return text
+    if is_array_type(_type):
+        if text.startswith("["):
+            return _text_item(text)
+        return [_text_item(x.strip()) for x in text.split(",") if x.strip()]
+    if _type.startswith("path") and text == "":
+        return None
+    return text
+
+
+def to_text(value):
+    """Write a value as text (INI or .env files); see :func:`from_text`."""
+    if isinstance(value, np.ndarray):
+        return json.dumps(value.tolist())
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if value is None:
+        return ""
+    return str(value)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Export the instrumentation of a configuration in the Prometheus text format.
+
+.. codeauthor:: Jaume Bonet <jaume.bonet@gmail.com>
+"""
+# Standard Libraries
+import os
+
+__all__ = ['prometheus_metrics', 'write_prometheus_metrics']
+
+
+def prometheus_metrics(config, prefix='libconfig', labels=None):
+    """Metrics of a configuration in the Prometheus text exposition format.
+
+    Metrics come from counters that the configuration keeps up to date, so
+    the options are not scanned. Access counters are only increased while
+    :meth:`.Config.instrument` is enabled, and load counters while loads
+    are profiled (see :meth:`.Config.profile_loads`).
+
+    :param config: Configuration to export.
+    :type config: :class:`.Config`
+    :param str prefix: Prefix of the metric names.
+    :param dict labels: Labels to add to all the metrics.
+
+    :return: :class:`str`
+    """
+    base = ",".join('{0}="{1}"'.format(k, _escape(v))
+                    for k, v in sorted((labels or {}).items()))
+
+    def sample(name, value, **extra):
+        tags = [base] if base else []
+        tags.extend('{0}="{1}"'.format(k, _escape(v))
+                    for k, v in sorted(extra.items()))
+        return "{0}_{1}{2} {3}".format(prefix, name,
+                                       "{" + ",".join(tags) + "}" if tags
+                                       else "", repr(float(value)))
+
+    lines = []
+
+    def metric(name, kind, description, samples):
+        lines.append("# HELP {0}_{1} {2}".format(prefix, name, description))
+        lines.append("# TYPE {0}_{1} {2}".format(prefix, name, kind))
+        lines.extend(samples)
+
+    totals = config._stats_totals
+    config._get_index()  # builds the set of locked options, if needed
+    metric("options", "gauge", "Registered options.",
+           [sample("options", config.gc.shape[0])])
+    metric("locked_options", "gauge", "Locked options.",
+           [sample("locked_options", len(config._locked))])
+    metric("generation", "counter", "Changes to the options.",
+           [sample("generation", config._generation)])
+    metric("option_calls_total", "counter", "Instrumented option accesses.",
+           [sample("option_calls_total", totals[i], method=method)
+            for method, i in (("get", 0), ("set", 2), ("check", 4))])
+    metric("option_seconds_total", "counter",
+           "Seconds spent in instrumented option accesses.",
+           [sample("option_seconds_total", totals[i + 1], method=method)
+            for method, i in (("get", 0), ("set", 2), ("check", 4))])
+    metric("cache_hits_total", "counter", "Memoized calls found in cache.",
+           [sample("cache_hits_total", config._cache_totals[0])])
+    metric("cache_misses_total", "counter",
+           "Memoized calls not found in cache.",
+           [sample("cache_misses_total", config._cache_totals[1])])
+    metric("loads_total", "counter", "Profiled loads.",
+           [sample("loads_total", config._loads)])
+    metric("load_seconds_total", "counter", "Seconds spent in profiled loads.",
+           [sample("load_seconds_total", config._load_totals.total)])
+    metric("load_stage_seconds_total", "counter",
+           "Seconds spent in each stage of profiled loads.",
+           [sample("load_stage_seconds_total", elapsed, stage=stage)
+            for stage, elapsed in config._load_totals.stages.items()])
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_metrics(config, filename, prefix='libconfig',
+                             labels=None):
+    """Write the metrics of :func:`.prometheus_metrics` to a file.
+
+    The file is replaced atomically, as expected by the textfile collector
+    of the Prometheus node exporter.
+
+    :param config: Configuration to export.
+    :type config: :class:`.Config`
+    :param str filename: Target file. Should end in ``.prom``.
+    :param str prefix: Prefix of the metric names.
+    :param dict labels: Labels to add to all the metrics.
+    """
+    temporary = "{0}.{1}.tmp".format(filename, os.getpid())
+    with open(temporary, "w") as fd:
+        fd.write(prometheus_metrics(config, prefix, labels))
+    os.rename(temporary, filename)
+
+
+def _escape(value):
+    """Escape a label value."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace(
+        "\n", "\\n")
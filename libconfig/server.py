@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+"""
+Serve a configuration to other local processes through a Unix socket.
+
+Messages are pickled: the socket has to be accessible only to trusted
+processes (it is created readable and writable only by its owner).
+
+.. codeauthor:: Jaume Bonet <jaume.bonet@gmail.com>
+"""
+# Standard Libraries
+import functools
+import os
+import select
+import socket
+import stat
+import struct
+import threading
+import types
+
+# External Libraries
+from six.moves import cPickle as pickle
+from six.moves import queue, socketserver
+
+# This Library
+from .config import Config
+from .shared import ReadOnlyConfig
+
+__all__ = ['ConfigServer', 'RemoteConfig']
+
+_LENGTH = struct.Struct('!I')
+# Seconds a client has to accept a notification before being disconnected
+_NOTIFY_TIMEOUT = 1.0
+
+
+def _send(sock, message):
+    """Send a length-prefixed pickled message."""
+    payload = pickle.dumps(message, protocol=2)
+    sock.sendall(_LENGTH.pack(len(payload)) + payload)
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise EOFError("connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _recv(sock):
+    """Receive a message sent with :func:`_send`."""
+    size = _LENGTH.unpack(_recv_exactly(sock, _LENGTH.size))[0]
+    return pickle.loads(_recv_exactly(sock, size))
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server.owner
+        while True:
+            try:
+                request = _recv(self.request)
+            except (EOFError, socket.error):
+                break
+            if request[0] == 'subscribe':
+                # notifications are only sent once subscribed
+                _send(self.request, ('ok', server.generation))
+                server._add_subscriber(self.request)
+            elif request[0] == 'snapshot':
+                with server.lock:
+                    response = ('ok', (server.generation,
+                                       server.config._state()))
+                _send(self.request, response)
+            elif request[0] == 'get':
+                try:
+                    with server.lock:
+                        response = ('ok', server.config.get_option(
+                            *request[1:]))
+                except Exception as e:
+                    response = ('error', e)
+                _send(self.request, response)
+            else:
+                _send(self.request, ('error', ValueError(
+                    'Unknown request {}'.format(request[0]))))
+        server._remove_subscriber(self.request)
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ConfigServer(object):
+    """Serve a :class:`.Config` over a Unix domain socket.
+
+    Clients are :class:`.RemoteConfig` instances. Changes to the served
+    configuration are notified to the clients, which drop their cached
+    copy. Notifications are sent from a background thread, so changes
+    never wait for the clients; clients that stop reading them are
+    disconnected.
+
+    :param config: Authoritative configuration to serve.
+    :type config: :class:`.Config`
+    :param str address: Path of the Unix socket to create.
+
+    .. ipython::
+
+        In [1]: from libconfig import Config, ConfigServer, RemoteConfig
+           ...: c = Config()
+           ...: c.register_option('opt', 'on', 1, 'int', 'option 1')
+           ...: with ConfigServer(c, '/tmp/libconfig.sock') as server:
+           ...:     remote = RemoteConfig('/tmp/libconfig.sock')
+           ...:     print('opt.one', remote.get_option('opt', 'on'))
+           ...:     remote.close()
+    """
+    def __init__(self, config, address):
+        self.config = config
+        self.address = address
+        self.generation = 0
+        self.lock = threading.RLock()
+        self._subscribers = set()
+        self._server = None
+        self._thread = None
+        self._notifier = None
+        self._notifications = queue.Queue()
+        self._subscription = None
+
+    def start(self):
+        """Start serving on a background thread.
+
+        A socket left at ``address`` by a server that is not running
+        anymore is replaced.
+
+        :raise:
+            :IOError: If ``address`` exists and is not a socket, or another
+                server is listening on it.
+        """
+        self._remove_stale_socket()
+        # Requests are unpickled: the socket has to be private from the
+        # moment it is bound, before anyone can connect to it.
+        umask = os.umask(0o177)
+        try:
+            self._server = _UnixServer(self.address, _RequestHandler)
+        finally:
+            os.umask(umask)
+        self._server.owner = self
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        self._notifier = threading.Thread(target=self._notify_clients)
+        self._notifier.daemon = True
+        self._notifier.start()
+        self._subscription = self.config.subscribe(None, None,
+                                                   self._on_change)
+
+    def _remove_stale_socket(self):
+        """Remove the socket at ``address`` if no server listens on it."""
+        try:
+            mode = os.lstat(self.address).st_mode
+        except OSError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise IOError("{0} exists and is not a socket".format(
+                self.address))
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.address)
+        except socket.error:
+            os.unlink(self.address)
+            return
+        finally:
+            sock.close()
+        raise IOError("A server is already listening on {0}".format(
+            self.address))
+
+    def stop(self):
+        """Stop serving, disconnect clients and remove the socket."""
+        if self._server is None:
+            return
+        self.config.unsubscribe(self._subscription)
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._notifications.put(None)
+        self._notifier.join()
+        for sock in list(self._subscribers):
+            self._drop_subscriber(sock)
+        self._server = self._thread = self._notifier = None
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def _on_change(self, keys):
+        self.notify()
+
+    def notify(self):
+        """Tell clients that the served configuration changed.
+
+        This is done automatically when the options change through the
+        :class:`.Config` API.
+
+        Clients are notified in the background: this does not wait for
+        them.
+
+        :return: :class:`int` - new generation of the served configuration.
+        """
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+        self._notifications.put(generation)
+        return generation
+
+    def _notify_clients(self):
+        """Send the notifications queued by :meth:`.notify` to clients."""
+        while True:
+            generation = self._notifications.get()
+            # only the last of the pending notifications has to be sent
+            while generation is not None:
+                try:
+                    generation = self._notifications.get_nowait()
+                except queue.Empty:
+                    break
+            if generation is None:
+                return
+            for sock in list(self._subscribers):
+                try:
+                    _, ready, _ = select.select([], [sock], [],
+                                                _NOTIFY_TIMEOUT)
+                    if not ready:
+                        raise socket.error("client is not reading")
+                    _send(sock, ('invalidate', generation))
+                except (socket.error, ValueError):
+                    self._drop_subscriber(sock)
+
+    def _add_subscriber(self, sock):
+        with self.lock:
+            self._subscribers.add(sock)
+
+    def _remove_subscriber(self, sock):
+        with self.lock:
+            self._subscribers.discard(sock)
+
+    def _drop_subscriber(self, sock):
+        """Disconnect a subscribed client."""
+        self._remove_subscriber(sock)
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+class RemoteConfig(ReadOnlyConfig):
+    """Read-only configuration served by a :class:`.ConfigServer`.
+
+    Options are fetched from the server all at once and cached locally;
+    the cache is dropped when the server notifies a change and fetched
+    again on the next call. A call works on a single copy of the options:
+    it is not replaced, even if the server notifies a change, until the
+    call returns.
+
+    :param str address: Path of the server's Unix socket.
+    """
+    def __init__(self, address):
+        self._stale = True
+        self._lost = self._closed = False
+        self._lock = threading.RLock()
+        self._depth = 0
+        super(RemoteConfig, self).__init__()
+        self.address = address
+        self.server_generation = None
+        self._sock = self._connect()
+        self._listener = self._connect()
+        _send(self._listener, ('subscribe', ))
+        _recv(self._listener)
+        thread = threading.Thread(target=self._listen)
+        thread.daemon = True
+        thread.start()
+        self.refresh()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.address)
+        return sock
+
+    def _listen(self):
+        while True:
+            try:
+                message = _recv(self._listener)
+            except (EOFError, socket.error):
+                # Without notifications, changes cannot be followed: the
+                # options are fetched again on every call.
+                if not self._closed:
+                    self._lost = self._stale = True
+                return
+            if message[0] == 'invalidate':
+                self._stale = True
+
+    def _request(self, *request):
+        _send(self._sock, request)
+        status, response = _recv(self._sock)
+        if status == 'error':
+            raise response
+        return response
+
+    def is_stale(self):
+        """Check if the server notified a change not fetched yet.
+
+        :return: :class:`bool`
+        """
+        return self._stale
+
+    def refresh(self):
+        """Fetch the options from the server."""
+        with self._lock:
+            # A notification arriving while fetching marks it stale again.
+            self._stale = self._lost
+            generation, state = self._request('snapshot')
+            self._from_state(state)
+            self.server_generation = generation
+
+    def close(self):
+        """Disconnect from the server."""
+        self._closed = True
+        for sock in (self._sock, self._listener):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            sock.close()
+
+    def __reduce__(self):
+        """Pickle only the address: unpickling connects to it again."""
+        return (RemoteConfig, (self.address, ))
+
+
+def _fresh(method):
+    """Run a method of :class:`.RemoteConfig` on an up to date copy.
+
+    The copy is fetched again, if stale, when the outermost call starts;
+    other threads cannot replace it until that call returns.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            self._depth += 1
+            try:
+                if self._depth == 1 and self._stale:
+                    self.refresh()
+                return method(self, *args, **kwargs)
+            finally:
+                self._depth -= 1
+    return wrapper
+
+
+for _name, _method in list(vars(Config).items()):
+    if not _name.startswith('_') and isinstance(_method, types.FunctionType) \
+       and _name not in vars(ReadOnlyConfig):
+        setattr(RemoteConfig, _name, _fresh(_method))
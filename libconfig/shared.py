@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Share a configuration between processes through a memory-mapped file.
+
+.. codeauthor:: Jaume Bonet <jaume.bonet@gmail.com>
+"""
+# Standard Libraries
+import mmap
+import os
+import struct
+import time
+
+# External Libraries
+from six.moves import cPickle as pickle
+
+# This Library
+from .config import Config
+
+__all__ = ['SharedConfig', 'publish_config']
+
+# magic, format version, sequence, payload length
+_HEADER = struct.Struct('<4sHxxQQ')
+_MAGIC = b'LCFG'
+_VERSION = 1
+_SEQUENCE = struct.Struct('<Q')
+_SEQUENCE_OFFSET = 8
+# Seconds to wait for a publisher to finish writing before giving up
+_WRITE_TIMEOUT = 5.0
+
+
+def publish_config(config, filename):
+    """Publish a snapshot of a configuration to a memory-mapped file.
+
+    Processes attached to the file through :class:`.SharedConfig` will see
+    the new snapshot the next time they call :meth:`.SharedConfig.refresh`.
+    Only one process should publish to a given file.
+
+    :param config: Configuration to publish.
+    :type config: :class:`.Config`
+    :param str filename: Target file. Created if it does not exist.
+
+    :return: :class:`int` - generation of the published snapshot.
+
+    :raise:
+        :ValueError: If ``filename`` exists and is not a published
+            configuration.
+    """
+    payload = pickle.dumps(config._state(), protocol=2)
+    if not os.path.isfile(filename):
+        with open(filename, 'wb') as fd:
+            fd.write(_HEADER.pack(_MAGIC, _VERSION, 0, 0))
+
+    with open(filename, 'r+b') as fd:
+        header = fd.read(_HEADER.size)
+        if len(header) < _HEADER.size or \
+           _HEADER.unpack(header)[:2] != (_MAGIC, _VERSION):
+            raise ValueError("{0} is not a published "
+                             "configuration".format(filename))
+        # The file only grows: attached processes may still be mapping it.
+        size = _HEADER.size + len(payload)
+        if os.path.getsize(filename) < size:
+            fd.truncate(size)
+        mm = mmap.mmap(fd.fileno(), 0)
+        try:
+            _, _, sequence, _ = _HEADER.unpack_from(mm, 0)
+            # A publisher that died while writing left the sequence odd.
+            sequence += sequence % 2
+            # An odd sequence tells readers that a write is in progress.
+            _SEQUENCE.pack_into(mm, _SEQUENCE_OFFSET, sequence + 1)
+            mm[_HEADER.size:size] = payload
+            _HEADER.pack_into(mm, 0, _MAGIC, _VERSION, sequence + 2,
+                              len(payload))
+            mm.flush()
+        finally:
+            mm.close()
+    return (sequence + 2) // 2
+
+
+class ReadOnlyConfig(Config):
+    """Base for configurations that mirror one owned by another process.
+
+    Any attempt to modify the options raises an error.
+    """
+    def _read_only(self, *args, **kwargs):
+        raise ValueError("This configuration is a read-only copy and "
+                         "cannot be modified")
+
+    register_option = unregister_option = _read_only
+    set_option = reset_option = reset_options = _read_only
+    lock_option = set_options_from_dict = _set_options = _read_only
+    set_options_from_values = restore = _read_only
+
+
+class SharedConfig(ReadOnlyConfig):
+    """Read-only configuration attached to a file published with
+    :func:`.publish_config`.
+
+    All processes attached to the same file share the published snapshot
+    through the OS page cache; attaching does not require registering the
+    options or reading any configuration file.
+
+    :param str filename: File the configuration was published to.
+    :param float timeout: Seconds to wait for a publisher to finish
+        writing a snapshot.
+
+    :raise:
+        :IOError: If ``filename`` does not exist.
+        :ValueError: If ``filename`` is not a published configuration.
+        :RuntimeError: If a snapshot is not fully written within
+            ``timeout``.
+    """
+    def __init__(self, filename, timeout=_WRITE_TIMEOUT):
+        super(SharedConfig, self).__init__()
+        if not os.path.isfile(filename):
+            raise IOError("File {0} not found".format(filename))
+        self.filename = filename
+        self.timeout = timeout
+        self.shared_generation = None
+        self._fd = open(filename, 'rb')
+        self._mm = None
+        try:
+            self.refresh()
+        except Exception:
+            self.close()
+            raise
+
+    def _map(self):
+        if self._mm is not None:
+            self._mm.close()
+        self._mm = mmap.mmap(self._fd.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) < _HEADER.size or \
+           _HEADER.unpack_from(self._mm, 0)[:2] != (_MAGIC, _VERSION):
+            raise ValueError("{0} is not a published "
+                             "configuration".format(self.filename))
+
+    def _sequence(self):
+        if self._mm is None:
+            self._map()
+        return _SEQUENCE.unpack_from(self._mm, _SEQUENCE_OFFSET)[0]
+
+    def is_stale(self):
+        """Check if a newer snapshot has been published.
+
+        :return: :class:`bool`
+        """
+        return self._sequence() // 2 != self.shared_generation
+
+    def refresh(self):
+        """Load the last published snapshot, if it is not loaded yet.
+
+        :return: :class:`bool` - :data:`True` if a new snapshot was loaded.
+
+        :raise:
+            :RuntimeError: If a snapshot is not fully written within
+                :attr:`timeout` (the publisher probably died while writing
+                it).
+        """
+        deadline = time.time() + self.timeout
+        while True:
+            sequence = self._sequence()
+            if sequence % 2 == 1:
+                # Publisher is writing.
+                if time.time() > deadline:
+                    raise RuntimeError(
+                        "{0} is still being written after {1} seconds; its "
+                        "publisher may have died".format(self.filename,
+                                                         self.timeout))
+                time.sleep(0.001)
+                continue
+            if sequence // 2 == self.shared_generation:
+                return False
+            _, _, _, length = _HEADER.unpack_from(self._mm, 0)
+            if _HEADER.size + length > len(self._mm):
+                # The file grew since it was mapped.
+                self._map()
+                continue
+            payload = self._mm[_HEADER.size:_HEADER.size + length]
+            if self._sequence() != sequence:
+                continue
+            break
+        if length == 0:
+            raise ValueError("{0} has no published "
+                             "configuration yet".format(self.filename))
+        self._from_state(pickle.loads(payload))
+        self.shared_generation = sequence // 2
+        return True
+
+    def __reduce__(self):
+        """Pickle only the file name: unpickling attaches to it again."""
+        return (SharedConfig, (self.filename, self.timeout))
+
+    def close(self):
+        """Release the mapped file."""
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._fd.close()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+.. codeauthor:: Jaume Bonet <jaume.bonet@gmail.com>
+"""
+# Standard Libraries
+import json
+import os
+import sys
+import textwrap
+
+# External Libraries
+import pytest
+
+# This Library
+from libconfig.cli import load_config, main
+
+MODULE = textwrap.dedent("""
+    import libconfig
+    options = libconfig.Config()
+    options.register_option("opt", "one", 1, "int", "option 1")
+    options.register_option("opt", "two", "a", "text", "option 2",
+                            values=["a", "b"])
+    options.register_option("opt", "fixed", 0, "int", "fixed", locked=True)
+""")
+
+
+class TestCLI(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmpdir, monkeypatch):
+        self.tmpdir = tmpdir.strpath
+        name = "cli_options_{}".format(os.path.basename(self.tmpdir))
+        with open(os.path.join(self.tmpdir, name + ".py"), "w") as fd:
+            fd.write(MODULE)
+        monkeypatch.syspath_prepend(self.tmpdir)
+        self.module = name
+        yield
+        sys.modules.pop(name, None)
+
+    def write(self, name, text):
+        filename = os.path.join(self.tmpdir, name)
+        with open(filename, "w") as fd:
+            fd.write(text)
+        return filename
+
+    def test_load_config(self):
+        """
+        The Config of a module can be found with or without its name.
+        """
+        config = load_config(self.module)
+        assert load_config(self.module + ":options") is config
+        with pytest.raises(ValueError):
+            load_config("json")
+
+    def test_list_and_show(self, capsys):
+        """
+        Options can be listed and the effective configuration printed.
+        """
+        assert main([self.module, "list", "--format", "markdown"]) == 0
+        assert "| **opt** | **two** | text | a | a, b | option 2 |" in \
+            capsys.readouterr().out
+
+        first = self.write("first.yaml", "opt:\n  one: 2\n  two: b\n")
+        second = self.write("second.env", "OPT__ONE=3\n")
+        assert main([self.module, "show", "--format", "json",
+                     first, second]) == 0
+        assert json.loads(capsys.readouterr().out) == {
+            "opt": {"one": 3, "two": "b", "fixed": 0}}
+
+    def test_convert(self):
+        """
+        Files can be converted between formats.
+        """
+        source = self.write("config.json", '{"opt": {"one": 5}}')
+        target = os.path.join(self.tmpdir, "config.ini")
+        assert main([self.module, "convert", source, target]) == 0
+        with open(target) as fd:
+            assert fd.read().startswith("[opt]\none = 5\n")
+
+    def test_validate(self, capsys):
+        """
+        Files are validated in parallel.
+        """
+        files = [self.write("good{}.yaml".format(i),
+                            "opt:\n  one: {}\n".format(i))
+                 for i in range(6)]
+        files.append(self.write("bad.yaml", "opt:\n  two: c\n"))
+        files.append(self.write("unknown.yaml", "opt:\n  three: 1\n"))
+        assert main([self.module, "validate", "-j", "2"] + files) == 1
+        lines = capsys.readouterr().out.splitlines()
+        assert len(lines) == 9
+        assert all(line.startswith("OK") for line in lines[:6])
+        assert lines[6].startswith("FAIL  {}: ValueError".format(files[6]))
+        assert lines[7] == "  opt.two: accepted options are: [a, b]"
+        assert lines[8].startswith("OK")
+
+        assert main([self.module, "validate", "--strict", "-j", "1",
+                     files[0], files[7]]) == 1
+        assert capsys.readouterr().out.splitlines()[1] == \
+            "FAIL  {}: unknown options: opt.three".format(files[7])
+        assert load_config(self.module).get_option("opt", "one") == 1
@@ -3,6 +3,7 @@
 .. codeauthor:: Jaume Bonet <jaume.bonet@gmail.com>
 """
 # Standard Libraries
+import json
 import os
 
 # External Libraries
@@ -251,3 +252,943 @@ class TestLibConfig(object):
         assert cfg.show_options("string").shape[0] == 2
         cfg.reset_options()
         assert cfg.show_options().shape[0] == 0
+
+    def test_array_types(self):
+        """
+        Array options are stored as read-only numpy arrays.
+        """
+        import numpy as np
+        c = libconfig.Config()
+        c.register_option("channel", "threshold", [0.1, 0.2, 0.3],
+                          "float_array", "per channel threshold",
+                          shape=(-1, ))
+        c.register_option("channel", "ids", [1, 2], "int_array",
+                          "active channels", values=[1, 2, 3])
+        c.register_option("channel", "mask", [True, False], "bool_array",
+                          "channel mask", shape=(2, ))
+
+        thr = c.get_option("channel", "threshold")
+        assert isinstance(thr, np.ndarray)
+        assert thr.dtype == np.float64
+        assert not thr.flags.writeable
+        assert thr is c.get_option("channel", "threshold")
+
+        c.set_option("channel", "threshold", np.arange(4))
+        assert c.get_option("channel", "threshold").dtype == np.float64
+        with pytest.raises(ValueError):
+            c.set_option("channel", "threshold", [[1.0, 2.0]])
+        with pytest.raises(ValueError):
+            c.set_option("channel", "ids", [1.5, 2])
+        with pytest.raises(ValueError):
+            c.set_option("channel", "ids", [1, 4])
+        for value in ([2 ** 63], np.array([2 ** 63], dtype=np.uint64)):
+            with pytest.raises(ValueError):
+                c.check_option("channel", "ids", value)
+            with pytest.raises(ValueError):
+                c.set_option("channel", "ids", value)
+        c.set_option("channel", "ids", np.array([3], dtype=np.uint64))
+        assert c.get_option("channel", "ids").tolist() == [3]
+        with pytest.raises(ValueError):
+            c.set_option("channel", "mask", [True, False, True])
+        with pytest.raises(ValueError):
+            c.check_option("channel", "mask", [True, False, True])
+        assert c.check_option("channel", "mask", [False, True])
+        with pytest.raises(ValueError):
+            c.register_option("channel", "single", 1, "int",
+                              "no shape for scalars", shape=(1, ))
+
+        filename = os.path.join(self.tmpdir, "arrays.yaml")
+        c.write_options_to_YAML(filename)
+        c.reset_options(empty=False)
+        assert len(c.get_option("channel", "threshold")) == 3
+        c.set_options_from_YAML(filename)
+        assert np.array_equal(c.get_option("channel", "threshold"),
+                              [0, 1, 2, 3])
+
+        # ragged arrays are skipped as any other invalid value
+        c.set_options_from_dict({"channel": {"ids": [[1, 2], [3]],
+                                             "mask": [False, False]}})
+        assert c.get_option("channel", "ids").tolist() == [3]
+        assert c.get_option("channel", "mask").tolist() == [False, False]
+
+    def test_batch(self):
+        """
+        Staged values are applied all together or not at all.
+        """
+        c = libconfig.Config()
+        c.register_option("opt", "one", 1, "int", "option 1")
+        c.register_option("opt", "two", "a", "text", "option 2",
+                          values=["a", "b"])
+        c.register_option("opt", "three", 3, "int", "option 3", locked=True)
+
+        with c.batch() as b:
+            b.set("opt", "one", 10)
+            b.set("OPT", "two", "b")
+            assert c.get_option("opt", "one") == 1
+        assert c.get_option("opt", "one") == 10
+        assert c.get_option("opt", "two") == "b"
+
+        for key, subkey, value in [("opt", "two", "c"),
+                                   ("opt", "three", 4),
+                                   ("opt", "four", 4),
+                                   ("opt", "two", 5)]:
+            with pytest.raises((ValueError, libconfig.NotRegisteredError)):
+                with c.batch() as b:
+                    b.set("opt", "one", 20)
+                    b.set(key, subkey, value)
+            assert c.get_option("opt", "one") == 10
+
+        with pytest.raises(KeyError):
+            with c.batch() as b:
+                b.set("opt", "one", 30)
+                raise KeyError()
+        assert c.get_option("opt", "one") == 10
+
+    def test_transaction(self):
+        """
+        Changes inside a failed transaction are reverted.
+        """
+        c = libconfig.Config()
+        c.register_option("opt", "one", 1, "int", "option 1")
+        c.register_option("opt", "two", 2, "int", "option 2")
+        c.register_option("opt", "three", 3, "int", "option 3")
+
+        with pytest.raises(KeyError):
+            with c.transaction():
+                c.set_option("opt", "one", 10)
+                c.unregister_option("opt", "two")
+                c.register_option("opt", "four", 4, "int", "option 4")
+                c.lock_option("opt", "three")
+                c.reset_options(empty=False)
+                raise KeyError()
+        assert c.get_option("opt", "one") == 1
+        assert c.get_option("opt", "two") == 2
+        with pytest.raises(libconfig.NotRegisteredError):
+            c.get_option("opt", "four")
+        assert list(c.show_options()["k2"]) == ["one", "two", "three"]
+        c.set_option("opt", "three", 30)
+
+        with c.transaction() as outer:
+            c.set_option("opt", "one", 10)
+            with c.transaction():
+                c.set_option("opt", "two", 20)
+            with c.transaction() as inner:
+                c.reset_options()
+                inner.rollback()
+            assert c.get_option("opt", "two") == 20
+            outer.rollback()
+        assert c.get_option("opt", "one") == 1
+        assert c.get_option("opt", "two") == 2
+        assert c.get_option("opt", "three") == 30
+
+        with c.transaction():
+            c.set_option("opt", "one", 10)
+        assert c.get_option("opt", "one") == 10
+
+    def test_on_option_value(self):
+        """
+        Temporary values are restored on exit.
+        """
+        c = libconfig.Config()
+        c.register_option("opt", "one", 1, "int", "option 1")
+        c.register_option("opt", "two", "a", "text", "option 2",
+                          values=["a", "b"])
+
+        with c.on_option_value({("opt", "one"): 10, ("OPT", "two"): "b"}):
+            assert c.get_option("opt", "one") == 10
+            assert c.get_option("opt", "two") == "b"
+        assert c.get_option("opt", "one") == 1
+        assert c.get_option("opt", "two") == "a"
+
+        with pytest.raises(ValueError):
+            with c.on_option_value("opt", "one", 10, "opt", "two", "c"):
+                pass
+        assert c.get_option("opt", "one") == 1
+        with pytest.raises(ValueError):
+            c.on_option_value("opt", "one")
+
+        with pytest.raises(KeyError):
+            with c.on_option_value("opt", "one", 10):
+                raise KeyError()
+        assert c.get_option("opt", "one") == 1
+
+    def test_pickle(self):
+        """
+        Configurations and their values can travel between processes.
+        """
+        import pickle
+        import numpy as np
+        c = libconfig.Config()
+        c.register_option("opt", "one", 1, "int", "option 1")
+        c.register_option("opt", "two", "a", "text", "option 2",
+                          values=["a", "b"], locked=True)
+        c.register_option("opt", "three", [1, 2], "int_array", "option 3")
+        c.set_option("opt", "one", 10)
+
+        c2 = pickle.loads(pickle.dumps(c))
+        assert c2.get_option("opt", "one") == 10
+        assert c2.get_option_default("opt", "one") == 1
+        assert c2.get_option_alternatives("opt", "two") == ["a", "b"]
+        assert not c2.get_option("opt", "three").flags.writeable
+        with pytest.raises(ValueError):
+            c2.set_option("opt", "two", "b")
+        assert len(pickle.dumps(c)) < len(pickle.dumps(c.gc))
+
+        values = c.dump_option_values()
+        assert len(values[2]) == 1
+        c2.set_option("opt", "three", [3])
+        c2.set_options_from_values(pickle.loads(pickle.dumps(values)))
+        assert c2.get_option("opt", "one") == 10
+        assert np.array_equal(c2.get_option("opt", "three"), [1, 2])
+
+        c.set_option("opt", "one", 1)
+        c2.set_options_from_values(c.dump_option_values(changed_only=False))
+        assert c2.get_option("opt", "one") == 1
+        with pytest.raises(libconfig.NotRegisteredError):
+            libconfig.Config().set_options_from_values(values)
+
+    def test_subscribe(self):
+        """
+        Subscribers are notified once per change or bulk change.
+        """
+        c = libconfig.Config()
+        c.register_option("opt", "one", 1, "int", "option 1")
+        c.register_option("opt", "two", 2, "int", "option 2")
+        c.register_option("other", "one", 3, "int", "option 3")
+
+        calls = {"all": [], "opt": [], "one": []}
+        c.subscribe(None, None, calls["all"].append)
+        c.subscribe("OPT", None, calls["opt"].append)
+        one = c.subscribe("opt", "one", calls["one"].append)
+
+        c.set_option("opt", "two", 20)
+        assert calls["all"] == [{("opt", "two")}]
+        assert calls["opt"] == [{("opt", "two")}]
+        assert calls["one"] == []
+
+        with c.on_option_value("opt", "one", 10, "other", "one", 30):
+            assert calls["all"][-1] == {("opt", "one"), ("other", "one")}
+            assert calls["opt"][-1] == {("opt", "one")}
+        assert len(calls["all"]) == 3
+        assert len(calls["one"]) == 2
+
+        filename = os.path.join(self.tmpdir, "config.yaml")
+        c.write_options_to_YAML(filename)
+        c.reset_options(empty=False)
+        assert len(calls["all"]) == 4
+        c.set_options_from_YAML(filename)
+        assert calls["all"][-1] == {("opt", "two")}
+        assert len(calls["all"]) == 5
+
+        with c.batch() as b:
+            b.set("opt", "one", 11)
+            b.set("opt", "two", 21)
+        assert calls["opt"][-1] == {("opt", "one"), ("opt", "two")}
+
+        assert len(calls["one"]) == 4
+        c.unsubscribe(one)
+        c.reset_option("opt", "one")
+        assert len(calls["one"]) == 4
+        assert calls["all"][-1] == {("opt", "one")}
+
+    def test_generation(self):
+        """
+        Generations grow with every change.
+        """
+        c = libconfig.Config()
+        assert c.generation == 0
+        c.register_option("opt", "one", 1, "int", "option 1")
+        c.register_option("opt", "two", 2, "int", "option 2")
+        c.register_option("other", "one", 3, "int", "option 3")
+        assert c.generation == 3
+        assert c.get_generation("opt") == 2
+        assert c.get_generation("opt", "one") == 1
+        assert c.get_generation("missing") == 0
+
+        c.set_option("OPT", "ONE", 10)
+        assert c.generation == 4
+        assert c.get_generation("opt", "one") == 4
+        assert c.get_generation("opt", "two") == 2
+        assert c.get_generation("other") == 3
+
+        generation = c.generation
+        with c.on_option_value("other", "one", 30):
+            assert c.get_generation("other") > generation
+        assert c.get_generation("opt") == 4
+        c.lock_option("opt", "two")
+        assert c.get_generation("opt", "two") == c.generation
+        c.reset_options(empty=False)
+        assert c.get_generation("opt", "one") == c.generation
+        with c.transaction() as t:
+            c.set_option("opt", "one", 10)
+            generation = c.generation
+            t.rollback()
+        assert c.generation > generation
+        assert c.get_generation("opt", "one") == c.generation
+
+    def test_memoize(self):
+        """
+        Cached results are dropped when their options change.
+        """
+        c = libconfig.Config()
+        c.register_option("numeric", "tolerance", 1, "int", "tolerance")
+        c.register_option("numeric", "other", 1, "int", "unrelated")
+        calls = []
+
+        @c.memoize(depends=[("numeric", "tolerance")], maxsize=2)
+        def solver(x, scale=1):
+            calls.append(x)
+            return x * scale * c.get_option("numeric", "tolerance")
+
+        assert solver(2) == 2
+        assert solver(2) == 2
+        assert solver(2, scale=3) == 6
+        assert calls == [2, 2]
+        assert solver.cache_info() == (1, 2, 2, 2)
+
+        c.set_option("numeric", "other", 5)
+        assert solver(2) == 2
+        assert len(calls) == 2
+
+        with c.on_option_value("numeric", "tolerance", 10):
+            assert solver(2) == 20
+        assert solver(2) == 2
+        assert len(calls) == 4
+
+        solver(3)
+        solver(4)
+        assert solver.cache_info().currsize == 2
+        solver(2)
+        assert calls[-1] == 2
+        solver.cache_clear()
+        assert solver.cache_info() == (0, 0, 2, 0)
+        assert solver.__name__ == "solver"
+
+    def test_nested_keys(self):
+        """
+        Dotted keys define nested sections.
+        """
+        import json
+        import yaml
+        c = libconfig.Config()
+        c.register_option("solver", "method", "lu", "text", "method")
+        c.register_option("solver.linear", "tol", 1e-3, "float", "tolerance")
+        c.register_option("solver.linear.precond", "kind", "ilu", "text",
+                          "preconditioner")
+        c.register_option("output", "folder", "./", "path_out", "folder")
+        with pytest.raises(ValueError):
+            c.register_option("solver.linear.tol", "x", 1, "int", "clash")
+        with pytest.raises(ValueError):
+            c.register_option("solver", "linear", 1, "int", "clash")
+        with pytest.raises(ValueError):
+            c.register_option("solver..linear", "x", 1, "int", "empty")
+        with pytest.raises(ValueError):
+            c.register_option("solver", "x.y", 1, "int", "dotted subkey")
+
+        assert c.get_option("Solver.Linear", "tol") == 1e-3
+        assert c.list_options("solver.linear") == [
+            ("solver.linear", "tol"), ("solver.linear.precond", "kind")]
+        assert len(c.list_options("solver")) == 3
+        assert c.list_options("missing") == []
+        assert c.show_options("solver.linear").shape[0] == 2
+
+        # nested sections are part of their parent sections
+        changes = []
+        c.subscribe("solver", None, changes.append)
+        c.subscribe("solver.linear", "kind", changes.append)
+        generation = c.get_generation("solver")
+        c.set_option("solver.linear.precond", "kind", "jacobi")
+        assert c.get_generation("solver") > generation
+        assert c.get_generation("solver.linear") == c.get_generation()
+        assert c.get_generation("output") < c.get_generation("solver")
+        assert changes == [{("solver.linear.precond", "kind")}]
+        c.set_option("solver.linear.precond", "kind", "ilu")
+
+        json_file = os.path.join(self.tmpdir, "nested.json")
+        yaml_file = os.path.join(self.tmpdir, "nested.yaml")
+        c.set_option("solver.linear", "tol", 1e-6)
+        c.write_options_to_JSON(json_file)
+        c.write_options_to_YAML(yaml_file)
+        data = json.load(open(json_file))
+        assert data["solver"]["linear"]["precond"]["kind"] == "ilu"
+        assert data["solver"]["method"] == "lu"
+        assert yaml.safe_load(open(yaml_file)) == data
+
+        c.reset_options(empty=False)
+        c.set_options_from_JSON(json_file)
+        assert c.get_option("solver.linear", "tol") == 1e-6
+        c.set_options_from_dict({"solver.linear.precond": {"kind": "jacobi"},
+                                 "solver": {"linear": {"tol": 1e-2,
+                                                       "unknown": 3}}})
+        assert c.get_option("solver.linear.precond", "kind") == "jacobi"
+        assert c.get_option("solver.linear", "tol") == 1e-2
+
+        c.unregister_option("solver.linear", "tol")
+        assert c.list_options("solver.linear") == [
+            ("solver.linear.precond", "kind")]
+        c.register_option("solver.linear", "tol", 1e-3, "float", "tolerance")
+        assert c.get_option("solver.linear", "tol") == 1e-3
+
+    def test_query(self):
+        """
+        Options can be searched by name pattern, type and lock.
+        """
+        c = libconfig.Config()
+        c.register_option("solver", "method", "lu", "text", "method")
+        c.register_option("solver.linear", "tol", 1e-3, "float", "tolerance")
+        c.register_option("solver.linear", "max_tol", 1.0, "float",
+                          "max tolerance", locked=True)
+        c.register_option("output", "folder", "./", "path_out", "folder")
+        c.register_option("output", "tol_file", "tol.txt", "path_out",
+                          "tolerance file")
+
+        def names(views):
+            return ["{0}.{1}".format(v.key, v.subkey) for v in views]
+
+        assert names(c.query("solver.*tol*")) == [
+            "solver.linear.tol", "solver.linear.max_tol"]
+        assert names(c.query("*TOL*")) == [
+            "solver.linear.tol", "solver.linear.max_tol", "output.tol_file"]
+        assert names(c.query(_type="path_out")) == ["output.folder",
+                                                    "output.tol_file"]
+        assert names(c.query("*tol*", locked=False)) == [
+            "solver.linear.tol", "output.tol_file"]
+        assert names(c.query(locked=True)) == ["solver.linear.max_tol"]
+        assert names(c.query(r"solver\.(linear\.)?m.*", regex=True)) == [
+            "solver.method", "solver.linear.max_tol"]
+        assert names(c.query(r"solver\.m", regex=True)) == []
+        assert c.query("missing.*") == []
+
+        view = c.query("output.folder")[0]
+        assert view.value == "./"
+        assert view.type == "path_out"
+        c.lock_option("output", "folder")
+        assert names(c.query("output.*", locked=True)) == ["output.folder"]
+        c.unregister_option("solver.linear", "max_tol")
+        assert names(c.query(locked=True)) == ["output.folder"]
+
+    def test_diff_and_merge(self):
+        """
+        Configurations can be compared and combined.
+        """
+        def build():
+            c = libconfig.Config()
+            c.register_option("opt", "one", 1, "int", "option 1")
+            c.register_option("opt", "two", "a", "text", "option 2")
+            c.register_option("opt", "fixed", 0, "int", "fixed", locked=True)
+            return c
+        c1, c2 = build(), build()
+        c1.register_option("only", "mine", 1, "int", "only in c1")
+        c2.register_option("only", "theirs", [1, 2], "int_array",
+                           "only in c2", locked=True)
+        c2.set_option("opt", "one", 10)
+        c2.set_option("opt", "two", "b")
+        c1.set_option("opt", "two", "c")
+
+        diff = c1.diff(c2)
+        assert diff.added == [("only", "theirs")]
+        assert diff.removed == [("only", "mine")]
+        assert list(diff.changed) == [("opt", "one"), ("opt", "two")]
+        assert diff.changed[("opt", "two")] == ("c", "b")
+        assert c1.diff(c1) == ([], [], {})
+
+        assert c1.merge(c2, policy="keep") == [("opt", "one")]
+        assert c1.get_option("opt", "two") == "c"
+        with pytest.raises(libconfig.NotRegisteredError):
+            c1.merge(c2, policy="strict")
+        with pytest.raises(ValueError):
+            c1.merge(c2, policy="unknown")
+        assert c1.merge(c2) == [("opt", "two")]
+        assert c1.get_option("opt", "two") == "b"
+
+        assert c1.merge(c2, policy="register") == [("only", "theirs")]
+        assert list(c1.get_option("only", "theirs")) == [1, 2]
+        with pytest.raises(ValueError):
+            c1.set_option("only", "theirs", [3])
+        assert c1.diff(c2) == ([], [("only", "mine")], {})
+
+        # failed merges do not register anything
+        c2.register_option("only", "more", 1, "int", "more")
+        c2.register_option("only.mine", "clash", 1, "int", "clash")
+        with pytest.raises(ValueError):
+            c1.merge(c2, policy="register")
+        assert c1.diff(c2)[0] == [("only", "more"), ("only.mine", "clash")]
+
+    def test_snapshot(self):
+        """
+        Snapshots share unchanged options and can be restored.
+        """
+        c = libconfig.Config()
+        for i in range(10):
+            c.register_option("opt", "n{}".format(i), i, "int", "option")
+        c.register_option("opt", "text", "a", "text", "text option")
+
+        first = c.snapshot()
+        assert c.snapshot() is first
+        assert len(first) == 11
+        c.set_option("opt", "n0", 100)
+        second = c.snapshot()
+        assert second is not first
+        assert len(second._entries) == 1
+        assert second.keys() is first.keys()
+        assert first.get("opt", "n0") == 0
+        assert second.get("OPT", "N0") == 100
+        assert second.get("opt", "n9") == 9
+        with pytest.raises(AttributeError):
+            second.generation = 0
+
+        c.set_option("opt", "text", "b")
+        c.lock_option("opt", "text")
+        c.register_option("new", "opt", 1, "int", "registered later")
+        c.restore(first)
+        assert c.get_option("opt", "n0") == 0
+        assert c.get_option("opt", "text") == "a"
+        assert c.get_option("new", "opt") == 1
+        c.set_option("opt", "text", "c")
+        assert c.snapshot().to_dict()[("opt", "text")] == "c"
+
+        with c.transaction() as t:
+            c.restore(second)
+            assert c.get_option("opt", "n0") == 100
+            t.rollback()
+        assert c.get_option("opt", "n0") == 0
+        assert c.get_option("opt", "text") == "c"
+
+        c.unregister_option("opt", "n5")
+        with pytest.raises(libconfig.NotRegisteredError):
+            c.restore(first)
+        assert c.get_option("opt", "text") == "c"
+        assert ("opt", "n5") not in c.snapshot()
+        with pytest.raises(libconfig.NotRegisteredError):
+            c.restore(first)
+
+        other = libconfig.Config()
+        other.register_option("opt", "n0", 5, "int", "option")
+        with pytest.raises(libconfig.NotRegisteredError):
+            other.restore(first)
+        snap = other.snapshot()
+        other.set_option("opt", "n0", 6)
+        c.restore(snap)
+        assert c.get_option("opt", "n0") == 5
+
+    def test_instrument(self):
+        """
+        Option accesses can be counted.
+        """
+        c = libconfig.Config()
+        c.register_option("opt", "one", 1, "int", "option 1")
+        c.register_option("opt", "two", "a", "text", "option 2")
+        c.get_option("opt", "one")
+        assert c.access_stats().shape[0] == 0
+        assert "get_option" not in c.__dict__
+
+        c.instrument()
+        for _ in range(3):
+            c.get_option("OPT", "one")
+        c.get_option("opt", "two")
+        c.set_option("opt", "two", "b")
+        c.check_option("opt", "two", "c")
+        with pytest.raises(ValueError):
+            c.set_option("opt", "one", "x")
+        c.instrument(False)
+        c.get_option("opt", "one")
+
+        df = c.access_stats()
+        assert list(df["k2"]) == ["one", "two"]
+        assert list(df["get_calls"]) == [3, 1]
+        assert list(df["set_calls"]) == [1, 1]
+        assert list(df["check_calls"]) == [0, 1]
+        assert (df["get_time"] > 0).all()
+        assert "opt" in c.access_report(top=1)
+        assert "get_option" not in c.__dict__
+        assert c.access_stats(reset=True).shape[0] == 2
+        assert c.access_stats().shape[0] == 0
+
+    def test_profile_loads(self):
+        """
+        Loads can report the time spent in each stage.
+        """
+        c = libconfig.Config()
+        c.register_option("opt", "one", 1, "int", "option 1")
+        c.register_option("opt", "two", "a", "text", "option 2")
+        c.register_option("opt", "three", 0.1, "float", "option 3")
+        data = {"opt": {"one": 2, "two": "b", "unknown": 3}}
+        assert c.set_options_from_dict(data) is None
+
+        profiles = []
+        hook = c.add_load_hook(profiles.append)
+        filename = os.path.join(self.tmpdir, "config.yaml")
+        c.write_options_to_YAML(filename)
+        profile = c.set_options_from_file(filename)
+        assert profiles == [profile]
+        assert profile.source.endswith("config.yaml")
+        assert list(profile.stages) == list(profile.STAGES)
+        assert profile.stages["read"] > 0 and profile.stages["parse"] > 0
+        assert profile.total >= sum(profile.stages.values())
+        c.remove_load_hook(hook)
+        assert c.set_options_from_dict(data) is None
+
+        c.profile_loads()
+        c.reset_options(empty=False)
+        profile = c.set_options_from_dict(data)
+        assert profile.options == 2
+        assert profile.stages["read"] == 0
+        assert sorted(profile.types) == ["int", "text"]
+        assert list(profile.types["int"]) == ["cast", "validate", "apply"]
+        assert profile.to_dict()["types"]["text"]["apply"] > 0
+        c.profile_loads(False)
+        assert c.set_options_from_dict(data) is None
+
+    def test_memory_report(self):
+        """
+        Memory used by each option can be reported.
+        """
+        c = libconfig.Config()
+        c.register_option("opt", "one", 1, "int", "short")
+        c.register_option("opt", "two", "a", "text", "long " * 1000,
+                          values=["a", "b"])
+        c.register_option("other", "one", [1.0] * 100, "float_array",
+                          "array")
+        df = c.memory_report()
+        assert list(df["k2"])[0] == "two"
+        assert df.loc[0, "description"] > 5000
+        assert df.loc[0, "values"] > 0
+        assert (df["total"] == df.drop(columns=["k1", "k2", "total"]
+                                       ).sum(axis=1)).all()
+        other = df[df["k1"] == "other"].iloc[0]
+        assert other["value"] >= 800
+        # value and default are the same array
+        assert other["default"] == 0
+
+        sections = c.memory_report(by_section=True)
+        assert list(sections["k1"]) == ["opt", "other"]
+        assert sections["total"].sum() == df["total"].sum()
+
+    def test_trace(self, monkeypatch):
+        """
+        Unused options and unmatched loaded values can be traced.
+        """
+        c = libconfig.Config()
+        c.register_option("opt", "one", 1, "int", "option 1")
+        c.register_option("opt", "two", "a", "text", "option 2")
+        c.register_option("opt.sub", "three", 0.1, "float", "option 3")
+        assert len(c.unused_options()) == 3
+
+        c.trace()
+        c.instrument()
+        c.get_option("OPT", "one")
+        c.instrument(False)
+        c.set_options_from_dict({"opt": {"two": "b", "four": 4,
+                                         "sub": {"three": 0.2, "five": 5}},
+                                 "other": {"six": 6}})
+        filename = os.path.join(self.tmpdir, "config.yaml")
+        with open(filename, "w") as fd:
+            fd.write("opt:\n  four: 4\n")
+        c.set_options_from_YAML(filename)
+        c.trace(False)
+        c.get_option("opt", "two")
+
+        assert c.unused_options() == [("opt", "two"), ("opt.sub", "three")]
+        assert list(c.unmatched_entries().items()) == [
+            (("opt", "four"), [None, filename]),
+            (("opt.sub", "five"), [None]), (("other", "six"), [None])]
+        assert "  opt.sub.three\n" in c.trace_report()
+        assert c.access_stats()["get_calls"].sum() == 1
+        assert "get_option" not in c.__dict__
+
+        c.trace()
+        assert len(c.unused_options()) == 3
+        assert len(c.unmatched_entries()) == 0
+
+        # the report at exit is only registered once
+        reports = []
+        monkeypatch.setattr(libconfig.config.atexit, "register",
+                            reports.append)
+        c.trace(at_exit=True)
+        c.trace(False)
+        c.trace(at_exit=True)
+        assert len(reports) == 1
+
+    def test_audit(self):
+        """
+        Changes to option values can be logged.
+        """
+        c = libconfig.Config()
+        c.register_option("opt", "one", 1, "int", "option 1")
+        c.register_option("opt", "two", "a", "text", "option 2")
+        c.set_option("opt", "one", 2)
+        assert c.audit_log() == []
+
+        c.audit(size=20)
+        c.set_option("opt", "one", 3)
+        with c.on_option_value("opt", "two", "b"):
+            pass
+        with c.batch() as b:
+            b.set("opt", "two", "c")
+        filename = os.path.join(self.tmpdir, "config.yaml")
+        with open(filename, "w") as fd:
+            fd.write("opt:\n  one: 4\n")
+        c.set_options_from_file(filename)
+        c.set_options_from_dict({"opt": {"one": 5}})
+        c.reset_option("opt", "one")
+        c.reset_options(empty=False)
+        with c.transaction() as t:
+            c.set_option("opt", "one", 6)
+            t.rollback()
+        values = c.dump_option_values()
+        c.set_options_from_values(c.dump_option_values())
+        c.set_option("opt", "one", 2)
+        c.set_options_from_values(values)
+        c.audit(False)
+        c.set_option("opt", "one", 7)
+
+        log = c.audit_log()
+        assert [(r.old, r.new, r.source) for r in log] == [
+            (2, 3, "set_option"),
+            ("a", "b", "on_option_value"), ("b", "a", "on_option_value"),
+            ("a", "c", "batch"), (3, 4, filename), (4, 5, "dict"),
+            (5, 1, "reset"), ("c", "a", "reset"),
+            (1, 6, "set_option"), (6, 1, "rollback"),
+            (1, 2, "set_option"), (2, 1, "values")]
+        assert log[0].key == "opt" and log[0].subkey == "one"
+        assert all(a.timestamp <= b.timestamp for a, b in zip(log, log[1:]))
+
+        c.audit(size=3)
+        assert [r.new for r in c.audit_log()] == [1, 2, 1]
+        output = os.path.join(self.tmpdir, "audit.jsonl")
+        c.write_audit_log(output)
+        with open(output) as fd:
+            records = [json.loads(line) for line in fd]
+        assert [r["new"] for r in records] == [1, 2, 1]
+        assert set(records[0]) == {"timestamp", "time", "key", "subkey",
+                                   "old", "new", "source"}
+
+    def test_document_formats(self):
+        """
+        Options can be documented in multiple formats.
+        """
+        c = libconfig.Config()
+        c.register_option("opt", "one", 1, "int", "option <1>")
+        c.register_option("other", "two", "a", "text", "option | 2",
+                          values=["a", "b"])
+        c.register_option("opt", "three", [1, 2], "int_array", "option 3")
+
+        assert c.document_options(details=True).split("\n") == [
+            "============  =========  =========  =======  ======  ===========",
+            "Option Class  Option ID       Type  Default  Values  Description",
+            "============  =========  =========  =======  ======  ===========",
+            "     **opt**    **one**        int        1          option <1>",
+            "   **other**    **two**       text        a    a, b  option | 2",
+            "     **opt**  **three**  int_array   [1, 2]          option 3",
+            "============  =========  =========  =======  ======  ==========="]
+
+        sections = c.document_options(by_section=True).split("\n")
+        assert sections[:4] == ["opt", "---", "", "=========  ==========="]
+        assert sections[7:9] == ["**three**  option 3",
+                                 "=========  ==========="]
+        assert sections[9:12] == ["", "other", "-----"]
+
+        assert c.document_options("Markdown").split("\n")[:4] == [
+            "| Option Class | Option ID | Description |",
+            "| --- | --- | --- |",
+            "| **opt** | **one** | option <1> |",
+            "| **other** | **two** | option \\| 2 |"]
+
+        filename = os.path.join(self.tmpdir, "options.html")
+        with open(filename, "w") as fd:
+            assert c.document_options("html", by_section=True,
+                                      stream=fd) is None
+        with open(filename) as fd:
+            html = fd.read()
+        assert html.startswith("<h2>opt</h2>\n<table>\n")
+        assert "<tr><td><strong>one</strong></td><td>option &lt;1&gt;" \
+            "</td></tr>" in html
+        assert html.count("<table>") == 2
+
+        with pytest.raises(ValueError):
+            c.document_options("latex")
+
+    def test_show_options_cache(self):
+        """
+        The options frame is cached until options change.
+        """
+        c = libconfig.Config()
+        c.register_option("opt", "one", 1, "int", "option 1")
+        c.register_option("other", "two", "a", "text", "option 2")
+
+        df = c.show_options()
+        assert c.show_options() is not df
+        assert c.show_options("OPT").equals(c.show_options("opt"))
+        assert c.show_options("opt").shape[0] == 1
+        with pytest.raises(ValueError):
+            df.iat[0, 2] = 5
+        with pytest.raises(ValueError):
+            df.loc[0, "value"] = 5
+
+        # changing the frame does not change the cached options
+        df["value"] = 9
+        df["extra"] = 1
+        df.drop(0, inplace=True)
+        df = c.show_options()
+        assert df["value"].tolist() == [1, "a"]
+        assert df.columns.tolist() == c.clmn
+
+        copy = c.show_options(copy=True)
+        assert copy is not df
+        copy.iat[0, 2] = 5
+        assert c.get_option("opt", "one") == 1
+
+        c.set_option("opt", "one", 2)
+        assert c.show_options()["value"].tolist() == [2, "a"]
+        with c.on_option_value("opt", "one", 3):
+            assert c.show_options("opt")["value"].tolist() == [3]
+        assert c.show_options("opt")["value"].tolist() == [2]
+
+    def test_file_formats(self):
+        """
+        Options can be written to and loaded from TOML, INI and dotenv
+        files, with the format guessed from the extension.
+        """
+        def build():
+            c = libconfig.Config()
+            c.register_option("opt", "int", 1, "int", "int")
+            c.register_option("opt", "float", 0.5, "float", "float")
+            c.register_option("opt", "flag", False, "bool", "bool")
+            c.register_option("opt", "text", "a", "text", "text",
+                              values=["a", "b c", 'd "e"'])
+            c.register_option("opt", "note", "", "text", "note")
+            c.register_option("opt.sub", "array", [1, 2], "int_array",
+                              "array")
+            c.register_option("opt.sub", "path", None, "path_in", "path")
+            return c
+
+        values = {("opt", "int"): 2, ("opt", "float"): 1.5,
+                  ("opt", "flag"): True, ("opt", "text"): 'd "e"',
+                  ("opt", "note"): "  two\n lines  ",
+                  ("opt.sub", "array"): [3, 4, 5],
+                  ("opt.sub", "path"): self.tmpdir}
+        source = build()
+        with source.batch() as b:
+            for k, v in values.items():
+                b.set(k[0], k[1], v)
+
+        formats = ["toml", "ini", "env", "yaml", "json"]
+        if libconfig.config.toml is None:
+            formats.remove("toml")
+        for file_format in formats:
+            filename = os.path.join(self.tmpdir, "config." + file_format)
+            source.write_options_to_file(filename)
+            target = build()
+            target.set_options_from_file(filename)
+            assert target.diff(source).changed == {}, file_format
+
+        with open(os.path.join(self.tmpdir, "config.env")) as fd:
+            env = fd.read().splitlines()
+        assert 'OPT__TEXT="d \\"e\\""' in env
+        assert "OPT__SUB__ARRAY=[3, 4, 5]" in env
+
+        filename = os.path.join(self.tmpdir, ".env")
+        with open(filename, "w") as fd:
+            fd.write("# comment\nexport OPT__INT=7\nopt__flag=no\n"
+                     "OPT__TEXT='b c'\nOPT__SUB__ARRAY=1, 2\nOTHER=1\n")
+        target = build()
+        target.set_options_from_file(filename)
+        assert target.get_option("opt", "int") == 7
+        assert target.get_option("opt", "flag") is False
+        assert target.get_option("opt", "text") == "b c"
+        assert list(target.get_option("opt.sub", "array")) == [1, 2]
+
+        filename = os.path.join(self.tmpdir, "config.ini")
+        with open(filename, "w") as fd:
+            fd.write("[opt]\nfloat = 3\n")
+        target.set_options_from_file(filename)
+        assert target.get_option("opt", "float") == 3.0
+        with open(filename, "w") as fd:
+            fd.write("[opt]\nint = x\n")
+        with pytest.raises(ValueError):
+            target.set_options_from_file(filename)
+        with open(filename, "w") as fd:
+            fd.write("[opt.sub]\narray = [1, 2\n[opt]\nflag = yes\n")
+        with pytest.raises(ValueError) as e:
+            target.set_options_from_file(filename, strict=True)
+        assert "opt.sub.array" in str(e.value)
+        target.set_options_from_file(filename)
+        assert target.get_option("opt", "flag") is True
+        with pytest.raises(ValueError):
+            target.set_options_from_file(filename, "xml")
+
+        filename = os.path.join(self.tmpdir, "config.cfg")
+        source.write_options_to_file(filename)
+        with open(filename) as fd:
+            assert fd.readline() == "opt:\n"
+
+    def test_json_schema(self):
+        """
+        Options are described as a JSON Schema, and whole dictionaries are
+        validated before being loaded.
+        """
+        c = libconfig.Config()
+        c.register_option("opt", "int", 1, "int", "int", values=[1, 2, 3])
+        c.register_option("opt", "text", "a", "text", "text")
+        c.register_option("opt", "fixed", 0.5, "float", "fixed", locked=True)
+        c.register_option("opt.sub", "array", [[1, 2]], "int_array", "array",
+                          shape=(-1, 2))
+        c.register_option("opt.sub", "path", None, "path_in", "path")
+        c.register_option("opt.sub", "any", [1.0], "float_array", "any",
+                          values=[1.0, 2.0])
+
+        schema = c.to_json_schema()
+        json.dumps(schema)
+        opt = schema["properties"]["opt"]
+        assert schema["additionalProperties"] is True
+        assert opt["properties"]["int"] == {
+            "type": "integer", "enum": [1, 2, 3], "default": 1,
+            "description": "int"}
+        assert opt["properties"]["fixed"]["readOnly"] is True
+        assert opt["properties"]["fixed"]["const"] == 0.5
+        array = opt["properties"]["sub"]["properties"]["array"]
+        assert array["default"] == [[1, 2]]
+        assert "minItems" not in array
+        assert array["items"]["type"] == "array"
+        assert array["items"]["maxItems"] == 2
+        assert array["items"]["items"] == {"type": "integer"}
+        array = opt["properties"]["sub"]["properties"]["any"]
+        assert array["items"] == {"$ref": "#/definitions/opt.sub.any"}
+        assert schema["definitions"]["opt.sub.any"] == {"anyOf": [
+            {"type": "number", "enum": [1.0, 2.0]},
+            {"type": "array", "items": array["items"]}]}
+        assert c.to_json_schema(False)["properties"]["opt"][
+            "additionalProperties"] is False
+
+        validate = c.compile_validator()
+        assert c.compile_validator() is validate
+        assert validate({"opt": {"int": 2, "fixed": 0.5, "other": 1},
+                         "opt.sub": {"path": self.tmpdir}}) == []
+        data = {"opt": {"int": 4, "fixed": 1.5, "other": 1,
+                        "sub": {"array": [1, 2], "path": "missing"}},
+                "list": []}
+        errors = validate(data)
+        assert len(errors) == 5
+        assert "opt.int: accepted options are: [1, 2, 3]" in errors
+        assert "opt.fixed: option is locked" in errors
+        assert "list: section has to be a dict" in errors
+        assert len(c.compile_validator(False)(data)) == 6
+
+        # nothing is loaded from rejected files
+        filename = os.path.join(self.tmpdir, "config.yaml")
+        with open(filename, "w") as fd:
+            fd.write("opt:\n  text: b\n  int: 4\n")
+        with pytest.raises(ValueError) as e:
+            c.set_options_from_file(filename, strict=True)
+        assert "opt.int" in str(e.value)
+        assert c.get_option("opt", "text") == "a"
+        c.set_options_from_file(filename)
+        assert c.get_option("opt", "text") == "b"
+        assert c.get_option("opt", "int") == 1
+
+        # paths are relative to the loaded file
+        os.mkdir(os.path.join(self.tmpdir, "data"))
+        assert validate({"opt.sub": {"path": "data"}}, filename) == []
+
+        c.register_option("opt", "new", 1, "int", "new")
+        assert c.compile_validator() is not validate
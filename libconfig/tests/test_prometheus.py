@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+.. codeauthor:: Jaume Bonet <jaume.bonet@gmail.com>
+"""
+# Standard Libraries
+import os
+
+# External Libraries
+import pytest
+
+# This Library
+import libconfig
+
+
+class TestPrometheus(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmpdir):
+        self.tmpdir = tmpdir.strpath
+
+    def test_metrics(self):
+        """
+        Instrumentation counters are exported in the text format.
+        """
+        c = libconfig.Config()
+        c.register_option("opt", "one", 1, "int", "option 1")
+        c.register_option("opt", "two", "a", "text", "option 2", locked=True)
+        c.instrument()
+        c.profile_loads()
+
+        @c.memoize(depends=[("opt", "one")])
+        def double(x):
+            return 2 * x * c.get_option("opt", "one")
+
+        double(1)
+        double(1)
+        c.set_option("opt", "one", 2)
+        c.set_options_from_dict({"opt": {"one": 3}})
+
+        text = libconfig.prometheus_metrics(c, labels={"job": 'a"b'})
+        lines = text.splitlines()
+        assert "# TYPE libconfig_options gauge" in lines
+        assert 'libconfig_options{job="a\\"b"} 2.0' in lines
+        assert 'libconfig_locked_options{job="a\\"b"} 1.0' in lines
+        assert 'libconfig_option_calls_total{job="a\\"b",method="get"} ' \
+            '1.0' in lines
+        assert 'libconfig_option_calls_total{job="a\\"b",method="set"} ' \
+            '2.0' in lines
+        assert 'libconfig_cache_hits_total{job="a\\"b"} 1.0' in lines
+        assert 'libconfig_cache_misses_total{job="a\\"b"} 1.0' in lines
+        assert 'libconfig_loads_total{job="a\\"b"} 1.0' in lines
+        assert 'libconfig_load_stage_seconds_total{job="a\\"b",' \
+            'stage="cast"}' in text
+        for line in lines:
+            if not line.startswith("#"):
+                float(line.split()[-1])
+
+        generation = "libconfig_generation {}".format(
+            float(c.get_generation()))
+        assert generation in libconfig.prometheus_metrics(c)
+
+        filename = os.path.join(self.tmpdir, "libconfig.prom")
+        libconfig.write_prometheus_metrics(c, filename, prefix="app")
+        with open(filename) as fd:
+            assert fd.read().startswith("# HELP app_options")
+        assert os.listdir(self.tmpdir) == ["libconfig.prom"]
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+.. codeauthor:: Jaume Bonet <jaume.bonet@gmail.com>
+"""
+# Standard Libraries
+import os
+import socket
+import time
+
+# External Libraries
+import pytest
+
+# This Library
+import libconfig
+
+
+class TestConfigServer(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmpdir):
+        self.address = os.path.join(tmpdir.strpath, "libconfig.sock")
+        self.cfg = libconfig.Config()
+        self.cfg.register_option("numeric", "integer", 4, "int", "an int")
+        self.cfg.register_option("string", "text", "alpha", "text",
+                                 "a text", values=["alpha", "beta"])
+
+    def test_serve(self):
+        """
+        Clients read the served options and follow its changes.
+        """
+        with libconfig.ConfigServer(self.cfg, self.address) as server:
+            assert os.stat(self.address).st_mode & 0o777 == 0o600
+            remote = libconfig.RemoteConfig(self.address)
+            other = libconfig.RemoteConfig(self.address)
+            assert remote.get_option("numeric", "integer") == 4
+            assert remote.get_option_description("string", "text") == \
+                "a text"
+            assert not remote.is_stale()
+            with pytest.raises(ValueError):
+                remote.set_option("numeric", "integer", 5)
+            with pytest.raises(libconfig.NotRegisteredError):
+                remote._request("get", "numeric", "missing")
+            assert remote._request("get", "numeric", "integer") == 4
+
+            server.config.set_option("numeric", "integer", 5)
+            assert server.generation == 1
+            for client in (remote, other):
+                for _ in range(200):
+                    if client.is_stale():
+                        break
+                    time.sleep(0.01)
+                # the options are only fetched again by public calls
+                assert client.gc["value"].tolist()[0] == 4
+                assert client.get_option("numeric", "integer") == 5
+                assert client.server_generation == 1
+                assert not client.is_stale()
+            assert server.notify() == 2
+            remote.close()
+            other.close()
+        assert not os.path.exists(self.address)
+
+    def test_address(self):
+        """
+        Only sockets left by stopped servers are replaced.
+        """
+        with open(self.address, "w") as fd:
+            fd.write("not a socket")
+        with pytest.raises(IOError):
+            libconfig.ConfigServer(self.cfg, self.address).start()
+        with open(self.address) as fd:
+            assert fd.read() == "not a socket"
+        os.unlink(self.address)
+
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.address)
+        stale.close()
+        with libconfig.ConfigServer(self.cfg, self.address):
+            with pytest.raises(IOError):
+                libconfig.ConfigServer(self.cfg, self.address).start()
+            remote = libconfig.RemoteConfig(self.address)
+            assert remote.get_option("numeric", "integer") == 4
+            remote.close()
+
+    def test_slow_client(self, monkeypatch):
+        """
+        Clients that do not read notifications are disconnected instead of
+        blocking changes to the served configuration.
+        """
+        monkeypatch.setattr(libconfig.server, "_NOTIFY_TIMEOUT", 0.05)
+        with libconfig.ConfigServer(self.cfg, self.address) as server:
+            remote = libconfig.RemoteConfig(self.address)
+            slow = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            slow.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024)
+            slow.connect(self.address)
+            libconfig.server._send(slow, ("subscribe", ))
+            libconfig.server._recv(slow)
+            for _ in range(100):
+                if len(server._subscribers) == 2:
+                    break
+                time.sleep(0.01)
+            for sock in server._subscribers:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024)
+            # the slow client never reads its notifications
+            for i in range(2000):
+                self.cfg.set_option("numeric", "integer", i)
+                if len(server._subscribers) == 1:
+                    break
+                time.sleep(0.002)
+            assert len(server._subscribers) == 1
+            for _ in range(200):
+                if remote.is_stale():
+                    break
+                time.sleep(0.01)
+            assert remote.get_option("numeric", "integer") == i
+            remote.close()
+            slow.close()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+.. codeauthor:: Jaume Bonet <jaume.bonet@gmail.com>
+"""
+# Standard Libraries
+import multiprocessing
+import os
+import struct
+
+# External Libraries
+import numpy as np
+import pytest
+
+# This Library
+import libconfig
+
+
+def _worker_value(args):
+    filename, key, subkey = args
+    shared = libconfig.SharedConfig(filename)
+    try:
+        return shared.get_option(key, subkey)
+    finally:
+        shared.close()
+
+
+class TestSharedConfig(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmpdir):
+        self.filename = os.path.join(tmpdir.strpath, "config.shared")
+        self.cfg = libconfig.Config()
+        self.cfg.register_option("numeric", "integer", 4, "int", "an int")
+        self.cfg.register_option("numeric", "array", [1.0, 2.0],
+                                 "float_array", "an array")
+        self.cfg.register_option("string", "text", "alpha", "text",
+                                 "a text", values=["alpha", "beta"])
+
+    def test_attach(self):
+        """
+        Attached configurations see the published values.
+        """
+        assert libconfig.publish_config(self.cfg, self.filename) == 1
+        shared = libconfig.SharedConfig(self.filename)
+        assert shared.shared_generation == 1
+        assert shared.get_option("numeric", "integer") == 4
+        assert shared.get_option_alternatives("string", "text") == \
+            ["alpha", "beta"]
+        array = shared.get_option("numeric", "array")
+        assert np.array_equal(array, [1.0, 2.0])
+        assert not array.flags.writeable
+        with pytest.raises(ValueError):
+            shared.set_option("numeric", "integer", 5)
+        with pytest.raises(ValueError):
+            shared.register_option("numeric", "other", 5, "int", "other")
+
+        self.cfg.set_option("numeric", "integer", 6)
+        for i in range(100):
+            # make the payload grow beyond the mapped size
+            self.cfg.register_option("extra", "option{}".format(i), i,
+                                     "int", "extra option {}".format(i))
+        assert not shared.is_stale()
+        assert libconfig.publish_config(self.cfg, self.filename) == 2
+        assert shared.is_stale()
+        assert shared.refresh()
+        assert not shared.refresh()
+        assert shared.shared_generation == 2
+        assert shared.get_option("numeric", "integer") == 6
+        assert shared.get_option("extra", "option99") == 99
+        shared.close()
+
+        with pytest.raises(IOError):
+            libconfig.SharedConfig(self.filename + ".missing")
+
+    def test_dead_publisher(self):
+        """
+        Snapshots left half written do not block attached configurations,
+        and are replaced by the next publication.
+        """
+        libconfig.publish_config(self.cfg, self.filename)
+        with open(self.filename, "r+b") as fd:
+            fd.seek(8)
+            fd.write(struct.pack("<Q", 3))
+        with pytest.raises(RuntimeError):
+            libconfig.SharedConfig(self.filename, timeout=0.05)
+        assert libconfig.publish_config(self.cfg, self.filename) == 3
+        shared = libconfig.SharedConfig(self.filename)
+        assert shared.get_option("numeric", "integer") == 4
+        shared.close()
+
+        other = self.filename + ".other"
+        with open(other, "w") as fd:
+            fd.write("numeric:\n  integer: 5\n")
+        with pytest.raises(ValueError):
+            libconfig.publish_config(self.cfg, other)
+        with open(other) as fd:
+            assert fd.read() == "numeric:\n  integer: 5\n"
+
+    def test_workers(self):
+        """
+        Pool workers attach without registering options.
+        """
+        libconfig.publish_config(self.cfg, self.filename)
+        pool = multiprocessing.Pool(2)
+        try:
+            values = pool.map(_worker_value,
+                              [(self.filename, "numeric", "integer"),
+                               (self.filename, "string", "text")])
+        finally:
+            pool.close()
+            pool.join()
+        assert values == [4, "alpha"]
+
+    def test_not_published(self):
+        """
+        Only published files can be attached.
+        """
+        with open(self.filename, "w") as fd:
+            fd.write("numeric:\n  integer: 4\n")
+        with pytest.raises(ValueError):
+            libconfig.SharedConfig(self.filename)
+
+    def test_pickle(self):
+        """
+        Pickled shared configurations attach again to the file.
+        """
+        import pickle
+        libconfig.publish_config(self.cfg, self.filename)
+        shared = libconfig.SharedConfig(self.filename)
+        shared2 = pickle.loads(pickle.dumps(shared))
+        assert isinstance(shared2, libconfig.SharedConfig)
+        assert shared2.get_option("numeric", "integer") == 4
+        shared.close()
+        shared2.close()
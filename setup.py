@@ -48,9 +48,11 @@ setup(
     platforms='UNIX',
     keywords='development',
 
-    install_requires=['pandas', 'pyyaml', 'six'],
+    install_requires=['pandas', 'numpy', 'pyyaml', 'six'],
+    extras_require={'toml': ['tomli; python_version < "3.11"']},
 
     packages=find_packages(exclude=['docs', 'test', 'sphinx-docs']),
+    entry_points={'console_scripts': ['libconfig = libconfig.cli:main']},
     include_package_data=True,
     cmdclass=versioneer.get_cmdclass(),
 )